@@ -0,0 +1,93 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.cache import lookup, store
+from app.database import run_db
+from app.schemas.users_schema import Token, UserResponse
+from app.users import get_user, get_user_by_email, update_password_hash, verify_password
+
+logger = logging.getLogger(__name__)
+
+# Development only: without SECRET_KEY, sign tokens with a random per-process key. Tokens
+# from one worker then fail on every other, so otherwise a missing key stops startup
+ALLOW_RANDOM_SECRET_KEY = os.getenv("ALLOW_RANDOM_SECRET_KEY", "false").lower() in ("1", "true", "yes")
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    if not ALLOW_RANDOM_SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not set (ALLOW_RANDOM_SECRET_KEY=1 allows a per-process key in development)")
+    logger.warning("SECRET_KEY is not set; using a random per-process key")
+    SECRET_KEY = secrets.token_urlsafe(32)
+
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "3600"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest())
+
+def create_access_token(user_id: int, ttl: int = ACCESS_TOKEN_TTL) -> str:
+    payload = _b64encode(json.dumps({"sub": user_id, "exp": int(time.time()) + ttl}).encode())
+    return f"{payload}.{_sign(payload)}"
+
+def decode_access_token(token: str) -> dict:
+    credentials_error = HTTPException(
+        status_code=401,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(payload)):
+            raise ValueError("bad signature")
+        claims = json.loads(_b64decode(payload))
+    except Exception:
+        raise credentials_error
+    if claims.get("exp", 0) < time.time():
+        raise credentials_error
+    return claims
+
+async def login(db: Session, email: str, password: str) -> Token:
+    user = await run_db(db, get_user_by_email, email)
+    valid, new_hash = await verify_password(password, user.hashed_password if user else None)
+    if not valid or not user.is_active:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this hash was made: upgrade it while we have the password
+        await run_db(db, update_password_hash, user.id, new_hash)
+    return Token(access_token=create_access_token(user.id), token_type="bearer")
+
+def _load_user(db: Session, user_id: int) -> Optional[dict]:
+    user = get_user(db, user_id)
+    if not user or not user.is_active:
+        return None
+    return UserResponse.from_orm(user).dict()
+
+async def authenticate_token(db: Session, token: str) -> UserResponse:
+    claims = decode_access_token(token)
+    # Signature and expiry are checked on every call; only the user row is cached
+    key = hashlib.sha256(token.encode()).hexdigest()
+    user = lookup("token", key)
+    if user is None:
+        user = await run_db(db, _load_user, claims["sub"])
+        if user is None:
+            raise HTTPException(status_code=401, detail="Inactive or unknown user", headers={"WWW-Authenticate": "Bearer"})
+        store("token", key, user, ttl=min(TOKEN_CACHE_TTL, max(claims["exp"] - time.time(), 1)))
+    return UserResponse.parse_obj(user)
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+
+class CacheBackend(ABC):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def generation(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    def bump_generation(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class MemoryCache(CacheBackend):
+    """Bounded LRU with a per-entry TTL, local to the worker process."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def bump_generation(self, namespace: str) -> int:
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            return self._generations[namespace]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update(size=len(self._data), max_entries=self.max_entries)
+        return stats
+
+class RedisCache(CacheBackend):
+    """Shared backend so every uvicorn worker sees the same entries and invalidations.
+
+    Accepts any redis-py compatible client, e.g. ``fakeredis.FakeRedis()`` locally.
+    """
+
+    def __init__(self, client, ttl: float = CACHE_TTL, prefix: str = "catalog:"):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCache":
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value, default=str), ex=int(ttl) or None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def generation(self, namespace: str) -> int:
+        return int(self.client.get(f"{self.prefix}{namespace}:generation") or 0)
+
+    def bump_generation(self, namespace: str) -> int:
+        return int(self.client.incr(f"{self.prefix}{namespace}:generation"))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        try:
+            stats["evictions"] = int(self.client.info("stats").get("evicted_keys", 0))
+        except Exception:
+            pass
+        return stats
+
+def _create_backend(url: str) -> CacheBackend:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        logger.info("Using shared Redis cache backend")
+        return RedisCache.from_url(url)
+    return MemoryCache()
+
+cache: CacheBackend = _create_backend(CACHE_URL)
+
+def set_backend(backend: CacheBackend) -> None:
+    global cache
+    cache = backend
+
+def _namespaced(namespace: str, key: str, generation: Optional[int] = None) -> str:
+    if generation is None:
+        generation = cache.generation(namespace)
+    return f"{namespace}:{generation}:{key}"
+
+def lookup(namespace: str, key: str) -> Optional[Any]:
+    return cache.get(_namespaced(namespace, key))
+
+def store(namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+    cache.set(_namespaced(namespace, key), value, ttl)
+
+def cached(namespace: str, key: str, loader: Callable[[], Any], ttl: Optional[float] = None, fill: bool = True) -> Any:
+    generation = cache.generation(namespace)
+    value = cache.get(_namespaced(namespace, key, generation))
+    if value is None:
+        value = loader()
+        # An invalidation while loading means value may predate the write; don't store it
+        if fill and cache.generation(namespace) == generation:
+            cache.set(_namespaced(namespace, key, generation), value, ttl)
+    return value
+
+def versioned(key: str, version: Optional[Sequence]) -> str:
+    """Cache key for the body of one resource version, so a body and its ETag can't diverge."""
+    if version is None:
+        return key
+    return f"{key}@{hashlib.sha256(repr(tuple(version)).encode()).hexdigest()[:16]}"
+
+def invalidate(namespace: str, key: Optional[str] = None) -> None:
+    # Dropping a whole namespace just bumps its generation; stale keys age out via LRU/TTL
+    if key is None:
+        cache.bump_generation(namespace)
+    else:
+        cache.delete(_namespaced(namespace, key))
@@ -1,10 +1,49 @@
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import Numeric, and_, bindparam, cast, event, exists, func, insert, or_, select, update
 from app.models.categories_model import Category, Product
-from app.schemas.categories_schema import CategoryCreate, ProductCreate, ProductUpdate
+from app.models.image_model import Image
+from app.schemas.categories_schema import CategoryCreate, CategoryResponse, CategoryWithProducts, BatchUpdateReport, PriceRule, ProductBatchItem, ProductBatchUpdate, ProductCreate, ProductResponse, ProductSummary, ProductUpdate, ProductWithImages
+from app.schemas.image_schema import ImageResponse
+from app.cache import MemoryCache, cached, invalidate, versioned
+from app.database import upsert_insert
+from app.replicas import fills_cache
+from app.suggest import SUGGEST_INDEX, suggest_index
+from app.facets import adjust_facets, facet_deltas, facet_rows, facet_values, recount_facets
+from app.pagination import SortSpec, paginate, resolve_sort
 from fastapi import HTTPException
 from datetime import datetime
-from typing import List
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+CATEGORY_ID_CACHE_SIZE = int(os.getenv("CATEGORY_ID_CACHE_SIZE", "10000"))
+CATEGORY_ID_CACHE_TTL = float(os.getenv("CATEGORY_ID_CACHE_TTL", "300"))
+PENDING_CATEGORY_IDS = "pending_category_ids"
+
+# Process-local name -> id map; names are unique and never renamed, the TTL covers
+# categories removed out of band
+category_ids = MemoryCache(max_entries=CATEGORY_ID_CACHE_SIZE, ttl=CATEGORY_ID_CACHE_TTL)
+
+PRODUCT_FIELDS = list(ProductResponse.__fields__)
+SUMMARY_FIELDS = list(ProductSummary.__fields__)
+
+CATEGORY_SORTS: Dict[str, SortSpec] = {
+    "id": (Category.id, False),
+    "created_at": (Category.created_at, False),
+    "-created_at": (Category.created_at, True),
+    "name": (Category.category_name, False),
+}
+
+PRODUCT_SORTS: Dict[str, SortSpec] = {
+    "id": (Product.id, False),
+    "created_at": (Product.created_at, False),
+    "-created_at": (Product.created_at, True),
+    "price": (Product.price, False),
+    "-price": (Product.price, True),
+    "rating": (Product.rating, False),
+    "-rating": (Product.rating, True),
+}
 
 def create_category(db: Session, category: CategoryCreate):
     db_category = Category(
@@ -15,46 +54,173 @@ def create_category(db: Session, category: CategoryCreate):
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
+    invalidate("categories")
     return db_category
 
-def get_all_categories(db: Session, skip: int = 0, limit: int = 100) -> List[Category]:
-    try:
-        stmt = select(Category).offset(skip).limit(limit)
-        categories = db.execute(stmt).scalars().all()
-        return categories
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to retrieve categories")
+def adjust_product_counts(db: Session, deltas: Dict[int, int]) -> None:
+    # Atomic in-SQL increments, in the caller's transaction; sorted so concurrent writers lock rows in the same order
+    for category_id, delta in sorted((key, delta) for key, delta in deltas.items() if key is not None):
+        if delta:
+            db.execute(
+                update(Category)
+                .where(Category.id == category_id)
+                .values(product_count=Category.product_count + delta)
+            )
 
-def get_category(db: Session, category_id: int) -> Category:
-    try:
-        category = db.get(Category, category_id)
-        if not category:
-            raise HTTPException(status_code=404, detail="Category not found")
-        return category
-    except HTTPException:
-        raise
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to retrieve category")
+def invalidate_categories() -> None:
+    # Cached bodies are keyed by the version of what they were read from, so a write makes
+    # them unreachable by itself; bumping the namespaces only lets the old entries go sooner
+    invalidate("categories")
+    invalidate("facets")
 
-def get_or_create_category(db: Session, category_name: str, image_link: str = None) -> int:
-    stmt = select(Category).where(Category.category_name == category_name)
-    db_category = db.execute(stmt).scalar_one_or_none()
-    if not db_category:
-        db_category = Category(
-            category_name=category_name,
-            image_link=image_link,
-            created_at=datetime.utcnow(),
+def recount_products(db: Session) -> None:
+    counts = (
+        select(func.count(Product.id))
+        .where(Product.category_id == Category.id)
+        .scalar_subquery()
+    )
+    db.execute(update(Category).values(product_count=counts))
+
+def top_products_per_category(db: Session, category_ids: List[int], per_category: int) -> Dict[int, List[dict]]:
+    """First products of each category in one windowed query (served by ix_products_category_id_id)."""
+    if not category_ids or per_category <= 0:
+        return {}
+    columns = [getattr(Product, name) for name in ProductSummary.__fields__]
+    ranked = (
+        select(
+            *columns,
+            func.row_number()
+            .over(partition_by=Product.category_id, order_by=Product.id)
+            .label("position"),
         )
-        db.add(db_category)
-        db.commit()
-        db.refresh(db_category)
-    return db_category.id
+        .where(Product.category_id.in_(category_ids))
+        .subquery()
+    )
+    stmt = (
+        select(*(ranked.c[name] for name in ProductSummary.__fields__))
+        .where(ranked.c.position <= per_category)
+        .order_by(ranked.c.category_id, ranked.c.position)
+    )
+    products: Dict[int, List[dict]] = {category_id: [] for category_id in category_ids}
+    for row in db.execute(stmt):
+        products[row.category_id].append(dict(row._mapping))
+    return products
 
-def create_product(db: Session, product: ProductCreate):
-    if product.category and not product.category_id:
-        product.category_id = get_or_create_category(db, product.category)
+def get_all_categories(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    include_products: bool = False,
+    per_category: int = 4,
+    version: Optional[tuple] = None,
+) -> List[CategoryResponse]:
+    spec = resolve_sort(CATEGORY_SORTS, sort)
+
+    def load():
+        try:
+            # Offset paging is kept for existing clients; a cursor supersedes it
+            categories = paginate(db, select(Category), Category.id, sort, spec, limit, cursor, skip)
+            rows = [CategoryResponse.from_orm(category).dict() for category in categories]
+            if include_products:
+                products = top_products_per_category(db, [row["id"] for row in rows], per_category)
+                for row in rows:
+                    row["products"] = products.get(row["id"], [])
+            return rows
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to retrieve categories")
 
-    db_product = Product(
+    key = f"{skip}:{limit}:{cursor}:{sort}:{per_category if include_products else 0}"
+    schema = CategoryWithProducts if include_products else CategoryResponse
+    return [schema.parse_obj(row) for row in cached("categories", versioned(key, version), load, fill=fills_cache(db))]
+
+def get_category(db: Session, category_id: int, version: Optional[tuple] = None) -> CategoryResponse:
+    def load():
+        try:
+            category = db.get(Category, category_id)
+            if not category:
+                raise HTTPException(status_code=404, detail="Category not found")
+            return CategoryResponse.from_orm(category).dict()
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to retrieve category")
+
+    return CategoryResponse.parse_obj(cached("category", versioned(str(category_id), version), load, fill=fills_cache(db)))
+
+def _insert_categories(db: Session, rows: List[dict]) -> Dict[str, int]:
+    """Insert the rows, skipping names that already exist; returns the ids it inserted."""
+    upsert = upsert_insert(db)
+    if upsert is not None:
+        stmt = (
+            upsert(Category)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["category_name"])
+            .returning(Category.category_name, Category.id)
+        )
+        return dict(db.execute(stmt).all())
+    inserted = {}
+    for row in rows:
+        try:
+            with db.begin_nested():
+                result = db.execute(insert(Category).values(**row))
+            inserted[row["category_name"]] = result.inserted_primary_key[0]
+        except IntegrityError:
+            pass
+    return inserted
+
+def upsert_categories(db: Session, names, image_link: str = None) -> Dict[str, int]:
+    """Resolve category names to ids, creating missing ones in the caller's transaction.
+
+    Inserts use ON CONFLICT DO NOTHING (or a savepoint per row where the dialect lacks
+    it), so concurrent callers creating the same name never fail on the unique
+    constraint; names another transaction won are read back.
+    """
+    ids: Dict[str, int] = {}
+    missing = []
+    for name in sorted(set(names)):
+        category_id = category_ids.get(name)
+        if category_id is None:
+            missing.append(name)
+        else:
+            ids[name] = category_id
+    if not missing:
+        return ids
+
+    by_name = select(Category.category_name, Category.id)
+    found = dict(db.execute(by_name.where(Category.category_name.in_(missing))).all())
+    new_names = [name for name in missing if name not in found]
+    if new_names:
+        now = datetime.utcnow()
+        rows = [{"category_name": name, "image_link": image_link, "created_at": now} for name in new_names]
+        found.update(_insert_categories(db, rows))
+        raced = [name for name in new_names if name not in found]
+        if raced:
+            found.update(db.execute(by_name.where(Category.category_name.in_(raced))).all())
+
+    # Published to the cache only once the transaction commits
+    db.info.setdefault(PENDING_CATEGORY_IDS, {}).update(found)
+    ids.update(found)
+    return ids
+
+def get_or_create_category(db: Session, category_name: str, image_link: str = None) -> int:
+    return upsert_categories(db, [category_name], image_link=image_link)[category_name]
+
+def _publish_category_ids(session: Session) -> None:
+    for name, category_id in session.info.pop(PENDING_CATEGORY_IDS, {}).items():
+        category_ids.set(name, category_id)
+
+def _discard_category_ids(session: Session) -> None:
+    session.info.pop(PENDING_CATEGORY_IDS, None)
+
+event.listen(Session, "after_commit", _publish_category_ids)
+event.listen(Session, "after_rollback", _discard_category_ids)
+
+def product_row(product: ProductCreate) -> dict:
+    return dict(
         name=product.name,
         price=product.price,
         old_price=product.old_price,
@@ -71,29 +237,199 @@ def create_product(db: Session, product: ProductCreate):
         in_stock=product.in_stock,
         created_at=product.created_at or datetime.utcnow(),
     )
+
+def create_product(db: Session, product: ProductCreate):
+    if product.category and not product.category_id:
+        product.category_id = get_or_create_category(db, product.category)
+
+    db_product = Product(**product_row(product))
     db.add(db_product)
+    adjust_product_counts(db, {product.category_id: 1})
+    adjust_facets(db, facet_deltas([], [facet_values(db_product)]))
     db.commit()
     db.refresh(db_product)
+    invalidate_categories()
+    if SUGGEST_INDEX:
+        suggest_index.add_product(db_product)
     return db_product
 
-def get_all_products(db: Session, skip: int = 0, limit: int = 100) -> List[Product]:
+def get_all_products(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+) -> List[Product]:
+    spec = resolve_sort(PRODUCT_SORTS, sort)
+    try:
+        return paginate(db, select(Product), Product.id, sort, spec, limit, cursor, skip)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to retrieve products")
+
+def resolve_fields(fields: str) -> List[str]:
+    if fields == "summary":
+        return SUMMARY_FIELDS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields '{fields}'. Allowed: summary or {', '.join(PRODUCT_FIELDS)}",
+        )
+    return requested
+
+def get_product_rows(
+    db: Session,
+    fields: List[str],
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+) -> List[Row]:
+    """Listing that selects only the requested columns (plus id and the sort key)."""
+    spec = resolve_sort(PRODUCT_SORTS, sort)
+    names = dict.fromkeys(["id", spec[0].key, *fields])
     try:
-        stmt = select(Product).offset(skip).limit(limit)
-        products = db.execute(stmt).scalars().all()
-        return products
+        stmt = select(*(getattr(Product, name) for name in names))
+        return paginate(db, stmt, Product.id, sort, spec, limit, cursor, skip, scalars=False)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to retrieve products")
 
-def get_product(db: Session, product_id: int) -> Product:
+def _escape_like(value: str) -> str:
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+def _has_colors(db: Session, colors: List[str]):
+    if db.get_bind().dialect.name == "postgresql":
+        # ARRAY containment, served by the GIN index
+        return Product.colors.contains(colors)
+    # Elsewhere colors is a JSON array: look for each color among its elements
+    conditions = []
+    for color in colors:
+        elements = func.json_each(Product.colors).table_valued("value")
+        conditions.append(exists(select(1).select_from(elements).where(elements.c.value == color)))
+    return and_(*conditions)
+
+def search_products(
+    db: Session,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    color: Optional[str] = None,
+    colors: Optional[List[str]] = None,
+    tags: Optional[List[str]] = None,
+    min_rating: Optional[float] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+) -> List[Product]:
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=400, detail="min_price cannot be greater than max_price")
+    spec = resolve_sort(PRODUCT_SORTS, sort)
+
+    stmt = select(Product)
+    if category_id is not None:
+        stmt = stmt.where(Product.category_id == category_id)
+    if min_price is not None:
+        stmt = stmt.where(Product.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(Product.price <= max_price)
+    if in_stock is not None:
+        stmt = stmt.where(Product.in_stock.is_(in_stock))
+    if color:
+        stmt = stmt.where(or_(Product.color == color, _has_colors(db, [color])))
+    if colors:
+        stmt = stmt.where(_has_colors(db, colors))
+    for tag in tags or []:
+        stmt = stmt.where(Product.tags.ilike(f"%{_escape_like(tag)}%", escape="!"))
+    if min_rating is not None:
+        stmt = stmt.where(Product.rating >= min_rating)
+
     try:
-        product = db.get(Product, product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        return product
+        return paginate(db, stmt, Product.id, sort, spec, limit, cursor)
     except HTTPException:
         raise
     except Exception:
-        raise HTTPException(status_code=500, detail="Failed to retrieve product")
+        raise HTTPException(status_code=500, detail="Failed to search products")
+
+def get_product(db: Session, product_id: int, version: Optional[tuple] = None) -> ProductResponse:
+    """Read-through cached; pass the version the ETag came from so body and tag always match."""
+    def load():
+        try:
+            product = db.get(Product, product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            return ProductResponse.from_orm(product).dict()
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=500, detail="Failed to retrieve product")
+
+    return ProductResponse.parse_obj(cached("product", versioned(str(product_id), version), load, fill=fills_cache(db)))
+
+def get_images_by_product(db: Session, product_ids: List[int]) -> Dict[int, List[ImageResponse]]:
+    """Load the galleries of several products with a single IN query."""
+    images: Dict[int, List[ImageResponse]] = {product_id: [] for product_id in product_ids}
+    if product_ids:
+        stmt = (
+            select(Image)
+            .where(Image.product_id.in_(product_ids))
+            .order_by(Image.product_id, Image.id)
+        )
+        for image in db.execute(stmt).scalars():
+            images[image.product_id].append(ImageResponse.from_orm(image))
+    return images
+
+def get_product_images(db: Session, product_id: int, version: Optional[tuple] = None) -> List[ImageResponse]:
+    get_product(db, product_id, version)
+    return get_images_by_product(db, [product_id])[product_id]
+
+def with_images(db: Session, products: List) -> List[ProductWithImages]:
+    images = get_images_by_product(db, [product.id for product in products])
+    return [
+        ProductWithImages(**ProductResponse.from_orm(product).dict(), images=images[product.id])
+        for product in products
+    ]
+
+def product_version(db: Session, product_id: int, include_images: bool = False) -> Optional[tuple]:
+    version = db.execute(
+        select(Product.updated_at, Product.created_at).where(Product.id == product_id)
+    ).one_or_none()
+    if version is None:
+        return None
+    if include_images:
+        version = tuple(version) + tuple(db.execute(
+            select(func.max(Image.id), func.count(Image.id)).where(Image.product_id == product_id)
+        ).one())
+    return tuple(version)
+
+def products_version(db: Session, include_images: bool = False) -> tuple:
+    # Each aggregate is a single index probe; there is no product delete path, so
+    # the newest write and the highest id change whenever any listing could
+    version = tuple(db.execute(
+        select(func.max(Product.updated_at), func.max(Product.created_at), func.max(Product.id))
+    ).one())
+    if include_images:
+        version += (db.execute(select(func.max(Image.id))).scalar(),)
+    return version
+
+def category_version(db: Session, category_id: int) -> Optional[tuple]:
+    version = db.execute(
+        select(Category.updated_at, Category.created_at).where(Category.id == category_id)
+    ).one_or_none()
+    return tuple(version) if version is not None else None
+
+def categories_version(db: Session, include_products: bool = False) -> tuple:
+    version = tuple(db.execute(
+        select(func.max(Category.updated_at), func.max(Category.created_at), func.max(Category.id))
+    ).one())
+    if include_products:
+        version += products_version(db)
+    return version
 
 def update_product(db: Session, product_id: int, product: ProductUpdate):
     db_product = db.get(Product, product_id)
@@ -106,12 +442,119 @@ def update_product(db: Session, product_id: int, product: ProductUpdate):
     if product.price is not None:
         db_product.old_price = db_product.price
 
-    update_data = product.dict(exclude_unset=True)
+    old_category_id = db_product.category_id
+    before = facet_values(db_product)
+    # "category" is the name used to resolve category_id above, not a column
+    update_data = product.dict(exclude_unset=True, exclude={"category"})
     for key, value in update_data.items():
         if key == "specifications" and value is not None:
             value = [spec.dict() for spec in value]
         setattr(db_product, key, value)
 
+    if db_product.category_id != old_category_id:
+        adjust_product_counts(db, {old_category_id: -1, db_product.category_id: 1})
+    adjust_facets(db, facet_deltas([before], [facet_values(db_product)]))
+
     db.commit()
     db.refresh(db_product)
-    return db_product
\ No newline at end of file
+    # Counts and embedded product summaries in category listings may have changed
+    invalidate_categories()
+    if SUGGEST_INDEX:
+        suggest_index.add_product(db_product)
+    return db_product
+
+def _apply_updates(db: Session, items: List[ProductBatchItem], repriced: Set[int] = frozenset()) -> None:
+    """repriced: ids whose old_price this batch already set, so it isn't overwritten."""
+    table = Product.__table__
+    # Rows setting the same columns share one UPDATE, sent as a single executemany
+    groups: Dict[tuple, List[dict]] = {}
+    for item in items:
+        data = item.dict(exclude_unset=True, exclude={"id", "category"})
+        if data.get("specifications") is not None:
+            data["specifications"] = [spec.dict() for spec in item.specifications]
+        record_old_price = "price" in data and "old_price" not in data and item.id not in repriced
+        groups.setdefault((tuple(sorted(data)), record_old_price), []).append(
+            {"b_id": item.id, **{f"b_{key}": value for key, value in data.items()}}
+        )
+
+    for (columns, record_old_price), params in groups.items():
+        if not columns:
+            continue
+        values = {column: bindparam(f"b_{column}") for column in columns}
+        if record_old_price:
+            # SET right-hand sides see the row before the update: old_price gets the previous price
+            values["old_price"] = table.c.price
+        db.execute(update(table).where(table.c.id == bindparam("b_id")).values(**values), params)
+
+def _apply_rule(db: Session, rule: PriceRule) -> Tuple[int, int]:
+    category_id = rule.category_id
+    if category_id is None:
+        if not rule.category:
+            raise HTTPException(status_code=400, detail="Rule needs category_id or category")
+        category_id = db.execute(
+            select(Category.id).where(Category.category_name == rule.category)
+        ).scalar_one_or_none()
+        if category_id is None:
+            raise HTTPException(status_code=404, detail=f"Category '{rule.category}' not found")
+
+    table = Product.__table__
+    result = db.execute(
+        update(table)
+        .where(table.c.category_id == category_id)
+        .values(
+            old_price=table.c.price,
+            price=func.round(cast(table.c.price * rule.price_factor, Numeric), 2),
+        )
+    )
+    return category_id, result.rowcount
+
+def update_products(db: Session, batch: ProductBatchUpdate) -> BatchUpdateReport:
+    """Apply many product updates and/or a category price rule in one transaction."""
+    items = batch.products
+    ids = [item.id for item in items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each product may appear only once per batch")
+
+    try:
+        current = dict(db.execute(select(Product.id, Product.category_id).where(Product.id.in_(ids))).all()) if ids else {}
+        missing = sorted(set(ids) - current.keys())
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Products not found: {missing}")
+
+        names = {item.category for item in items if item.category and not item.category_id}
+        if names:
+            resolved = upsert_categories(db, names)
+            for item in items:
+                if item.category and not item.category_id:
+                    item.category_id = resolved[item.category]
+
+        deltas: Dict[int, int] = {}
+        for item in items:
+            if item.category_id is not None and item.category_id != current[item.id]:
+                deltas[current[item.id]] = deltas.get(current[item.id], 0) - 1
+                deltas[item.category_id] = deltas.get(item.category_id, 0) + 1
+
+        before = facet_rows(db, ids)
+        updated, repriced = len(items), set()
+        if batch.rule:
+            # The rule goes first so explicit values win and old_price is the price before the batch
+            category_id, count = _apply_rule(db, batch.rule)
+            repriced = {product_id for product_id, category in current.items() if category == category_id}
+            updated += count - len(repriced)
+        _apply_updates(db, items, repriced)
+        adjust_product_counts(db, deltas)
+        adjust_facets(db, facet_deltas(before, facet_rows(db, ids)))
+        if batch.rule:
+            # A rule reprices a whole category: rebuilding its cells beats diffing every row
+            recount_facets(db, [category_id])
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to update products")
+
+    invalidate("product")
+    invalidate_categories()
+    return BatchUpdateReport(updated=updated)
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Sequence
+from fastapi import Request, Response
+
+# Sent with every catalog read; the default lets clients and CDNs keep a copy but
+# revalidate it each time, which the ETag makes a cheap 304
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "public, no-cache")
+
+def validators(request: Request, version: Sequence) -> Dict[str, str]:
+    """ETag, Last-Modified and Cache-Control headers for a resource version.
+
+    The version is whatever cheaply identifies the current state (timestamps, ids);
+    it is hashed together with the query string, so every page and option gets its own tag.
+    """
+    digest = hashlib.sha256(repr((request.url.path, str(request.url.query), tuple(version))).encode()).hexdigest()
+    headers = {"ETag": f'"{digest[:32]}"', "Cache-Control": HTTP_CACHE_CONTROL}
+    timestamps = [value for value in version if isinstance(value, datetime)]
+    # Last-Modified has whole-second resolution: while the current second lasts, another
+    # write could share it and If-Modified-Since would call the stale copy fresh
+    if timestamps and max(timestamps) < datetime.utcnow().replace(microsecond=0):
+        # Columns are naive UTC
+        headers["Last-Modified"] = format_datetime(max(timestamps).replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def is_fresh(request: Request, headers: Dict[str, str]) -> bool:
+    """True when the client's copy matches, per If-None-Match or else If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+def not_modified(request: Request, response: Response, version: Optional[Sequence]) -> Optional[Response]:
+    """Return a bodiless 304 if the client is up to date; otherwise put the validators on response.
+
+    A version of None (resource not found) adds nothing, so the normal 404 path runs.
+    """
+    if version is None:
+        return None
+    headers = validators(request, version)
+    if is_fresh(request, headers):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
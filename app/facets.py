@@ -0,0 +1,176 @@
+import os
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.cache import cached, versioned
+from app.database import upsert_insert
+from app.models.categories_model import Product, ProductFacet
+from app.replicas import fills_cache
+
+# Upper bounds of the price buckets; the last bucket is open-ended
+FACET_PRICE_BUCKETS = [float(bound) for bound in os.getenv("FACET_PRICE_BUCKETS", "5,10,25,50,100,250").split(",")]
+FACET_RECOUNT_BATCH = int(os.getenv("FACET_RECOUNT_BATCH", "10000"))
+
+NO_CATEGORY = 0
+UNSET = -1
+FACET_FIELDS = ("category_id", "price", "rating", "in_stock", "color", "colors")
+FACET_COLUMNS = [getattr(Product, field) for field in FACET_FIELDS]
+KEY_COLUMNS = ["category_id", "price_bucket", "rating_band", "in_stock", "color"]
+
+FacetKey = Tuple[int, int, int, bool, str]
+
+def price_bucket(price: Optional[float]) -> int:
+    return UNSET if price is None else bisect_right(FACET_PRICE_BUCKETS, price)
+
+def price_bounds(bucket: int) -> Tuple[Optional[float], Optional[float]]:
+    if bucket == UNSET:
+        return None, None
+    low = FACET_PRICE_BUCKETS[bucket - 1] if bucket else 0.0
+    high = FACET_PRICE_BUCKETS[bucket] if bucket < len(FACET_PRICE_BUCKETS) else None
+    return low, high
+
+def rating_band(rating: Optional[float]) -> int:
+    return UNSET if rating is None else min(max(int(rating), 0), 5)
+
+def facet_values(product) -> dict:
+    return {field: getattr(product, field) for field in FACET_FIELDS}
+
+def facet_keys(values: dict) -> List[FacetKey]:
+    """The cells one product counts towards: its "" cell plus one per color."""
+    base = (
+        values.get("category_id") or NO_CATEGORY,
+        price_bucket(values.get("price")),
+        rating_band(values.get("rating")),
+        bool(values.get("in_stock")),
+    )
+    # Same colors the search filter matches on: the color column or any of colors
+    colors = set(values.get("colors") or [])
+    colors.add(values.get("color"))
+    return [base + ("",)] + [base + (color,) for color in sorted(color for color in colors if color)]
+
+def facet_deltas(before: Iterable[dict], after: Iterable[dict]) -> Counter:
+    deltas = Counter()
+    for values in before:
+        deltas.subtract(facet_keys(values))
+    for values in after:
+        deltas.update(facet_keys(values))
+    return deltas
+
+def facet_rows(db: Session, product_ids: List[int]) -> List[dict]:
+    if not product_ids:
+        return []
+    rows = db.execute(select(*FACET_COLUMNS).where(Product.id.in_(product_ids))).all()
+    return [dict(row._mapping) for row in rows]
+
+def _increment(db, change: dict) -> bool:
+    key = and_(*(getattr(ProductFacet, column) == change[column] for column in KEY_COLUMNS))
+    stmt = update(ProductFacet).where(key).values(product_count=ProductFacet.product_count + change["product_count"])
+    return db.execute(stmt).rowcount > 0
+
+def adjust_facets(db: Session, deltas: Dict[FacetKey, int]) -> None:
+    # Counts change by increments in SQL, so concurrent writers never overwrite each other;
+    # sorted so they lock cells in the same order
+    changes = [
+        dict(zip(KEY_COLUMNS, key), product_count=delta)
+        for key, delta in sorted(deltas.items()) if delta
+    ]
+    if not changes:
+        return
+    upsert = upsert_insert(db)
+    if upsert is not None:
+        stmt = upsert(ProductFacet)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=KEY_COLUMNS,
+            set_={"product_count": ProductFacet.product_count + stmt.excluded.product_count},
+        )
+        db.execute(stmt, changes)
+        return
+    # No upsert: update existing cells, insert missing ones
+    for change in changes:
+        if _increment(db, change):
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(ProductFacet).values(**change))
+        except IntegrityError:
+            # Another transaction created the cell first
+            _increment(db, change)
+
+def recount_facets(db: Session, category_ids: Optional[List[int]] = None) -> None:
+    """Rebuild the counts from products: all of them, or only the given categories'."""
+    clear = delete(ProductFacet)
+    products = select(*FACET_COLUMNS).execution_options(yield_per=FACET_RECOUNT_BATCH)
+    if category_ids is not None:
+        clear = clear.where(ProductFacet.category_id.in_(category_ids))
+        products = products.where(Product.category_id.in_(category_ids))
+    db.execute(clear)
+    counts = Counter()
+    for row in db.execute(products):
+        counts.update(facet_keys(row._mapping))
+    adjust_facets(db, counts)
+
+_DIMENSIONS = {
+    "categories": ProductFacet.category_id,
+    "colors": ProductFacet.color,
+    "price": ProductFacet.price_bucket,
+    "rating": ProductFacet.rating_band,
+    "in_stock": ProductFacet.in_stock,
+}
+
+def _label(name: str, value) -> dict:
+    if name == "categories":
+        return {"value": None if value == NO_CATEGORY else value}
+    if name == "price":
+        low, high = price_bounds(value)
+        return {"value": value, "min": low, "max": high}
+    if name == "rating":
+        return {"value": None if value == UNSET else value}
+    return {"value": value}
+
+def get_facets(
+    db: Session,
+    category_id: Optional[int] = None,
+    color: Optional[str] = None,
+    price_bucket: Optional[int] = None,
+    min_rating: Optional[int] = None,
+    in_stock: Optional[bool] = None,
+    version: Optional[tuple] = None,
+) -> dict:
+    """Counts per facet value for the products matching the filters.
+
+    Each facet ignores its own filter, so a sidebar can still show the other values
+    of the facet the shopper has narrowed on. Reads only the summary table.
+    """
+    filters = {
+        "categories": ProductFacet.category_id == category_id if category_id is not None else None,
+        "colors": ProductFacet.color == color if color else None,
+        "price": ProductFacet.price_bucket == price_bucket if price_bucket is not None else None,
+        "rating": ProductFacet.rating_band >= min_rating if min_rating is not None else None,
+        "in_stock": ProductFacet.in_stock == in_stock if in_stock is not None else None,
+    }
+
+    def query(skip: Optional[str], *columns):
+        stmt = select(*columns).where(ProductFacet.product_count > 0)
+        for name, condition in filters.items():
+            if name != skip and condition is not None:
+                stmt = stmt.where(condition)
+        # Without a color filter, count each product once through its "" cell
+        if skip == "colors":
+            stmt = stmt.where(ProductFacet.color != "")
+        elif not color:
+            stmt = stmt.where(ProductFacet.color == "")
+        return stmt
+
+    def load():
+        products = func.sum(ProductFacet.product_count)
+        result = {"total": db.execute(query(None, products)).scalar() or 0}
+        for name, column in _DIMENSIONS.items():
+            rows = db.execute(query(name, column, products).group_by(column).order_by(column)).all()
+            result[name] = [dict(_label(name, value), count=count) for value, count in rows]
+        return result
+
+    key = f"{category_id}:{color}:{price_bucket}:{min_rating}:{in_stock}"
+    return cached("facets", versioned(key, version), load, fill=fills_cache(db))
@@ -1,16 +1,254 @@
 # app/images.py
-import cloudinary.uploader
+import asyncio
+import hashlib
+import io
 import logging
-import uuid
+import os
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from app import uploader as uploader_module
+from app.database import run_db
+from typing import BinaryIO, Dict, Optional, List, Tuple
 from app.models.image_model import Image
 from app.models.users_model import User  
 from app.models.categories_model import Product, Category 
 
+try:
+    from PIL import Image as PILImage
+except ImportError:  # optional: without Pillow no thumbnails are generated
+    PILImage = None
+
 logger = logging.getLogger(__name__)
 
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "4"))
+IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "320"))
+# Thumbnails generated at once per worker process
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+HASH_CHUNK_SIZE = 1024 * 1024
+OWNER_COLUMNS = ("user_id", "product_id", "category_id")
+THUMBNAIL_SUFFIX = "_thumb"
+
+_variant_slots = asyncio.Semaphore(IMAGE_VARIANT_WORKERS)
+
+def _digest(file: BinaryIO) -> str:
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+def make_thumbnail(file: BinaryIO, size: int = IMAGE_THUMBNAIL_SIZE) -> Optional[bytes]:
+    # Pillow reads the upload as it decodes, never holding the file's bytes in full,
+    # and releases the GIL while decoding and resampling, so a thread is enough
+    if PILImage is None:
+        return None
+    try:
+        with PILImage.open(file) as picture:
+            # JPEGs decode straight at a fraction of their size
+            picture.draft("RGB", (size, size))
+            picture.thumbnail((size, size))
+            out = io.BytesIO()
+            picture.convert("RGB").save(out, format="JPEG", quality=85, optimize=True)
+            return out.getvalue()
+    finally:
+        file.seek(0)
+
+async def _make_variant(file: BinaryIO) -> Optional[bytes]:
+    if PILImage is None:
+        return None
+    async with _variant_slots:
+        try:
+            return await run_in_threadpool(make_thumbnail, file)
+        except Exception as e:
+            logger.error(f"Failed to generate thumbnail: {str(e)}")
+            return None
+
+# Leading bytes of the formats we accept; "?" matches any byte
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"RIFF????WEBP", "image/webp"),
+)
+
+# ISO-BMFF (HEIF/AVIF) files start with an ftyp box: size, "ftyp", major brand, minor
+# version, then compatible brands. Checked in order, so e.g. an AVIF tagged mif1 is avif
+FTYP_BRANDS = (
+    ({b"avif", b"avis"}, "image/avif"),
+    ({b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"hevm", b"hevs"}, "image/heic"),
+    ({b"mif1", b"msf1"}, "image/heif"),
+)
+SNIFF_BYTES = 64
+
+def _matches(header: bytes, signature: bytes) -> bool:
+    return len(header) >= len(signature) and all(
+        expected == ord("?") or actual == expected for actual, expected in zip(header, signature)
+    )
+
+def _ftyp_brands(header: bytes) -> set:
+    if len(header) < 12 or header[4:8] != b"ftyp":
+        return set()
+    end = min(int.from_bytes(header[:4], "big"), len(header))
+    return {header[8:12]} | {header[i:i + 4] for i in range(16, end - 3, 4)}
+
+async def sniff_image_type(file: UploadFile) -> Optional[str]:
+    """Detect the image type from magic bytes; None if it is not a supported image."""
+    header = await file.read(SNIFF_BYTES)
+    await file.seek(0)
+    kind = next((kind for signature, kind in IMAGE_SIGNATURES if _matches(header, signature)), None)
+    if kind is None:
+        brands = _ftyp_brands(header)
+        kind = next((kind for known, kind in FTYP_BRANDS if brands & known), None)
+    return kind
+
+def _referenced(db: Session, public_ids: List[str]) -> set:
+    bases = {public_id.removesuffix(THUMBNAIL_SUFFIX) for public_id in public_ids}
+    referenced = set(db.execute(select(Image.public_id).where(Image.public_id.in_(bases))).scalars())
+    return {public_id for public_id in public_ids if public_id.removesuffix(THUMBNAIL_SUFFIX) in referenced}
+
+async def _cleanup_uploads(public_ids: List[str], db: Optional[Session] = None) -> None:
+    """Delete objects this request uploaded, keeping any an Image row references.
+
+    Objects are content-addressed, so another request may have uploaded the same one
+    and saved a row for it meanwhile; pass db so those are left alone.
+    """
+    if db is not None and public_ids:
+        try:
+            referenced = await run_db(db, _referenced, public_ids)
+        except Exception as e:
+            logger.error(f"Not cleaning up uploaded images, could not check references: {e}")
+            return
+        public_ids = [public_id for public_id in public_ids if public_id not in referenced]
+    results = await asyncio.gather(
+        *(run_in_threadpool(uploader_module.uploader.destroy, public_id) for public_id in public_ids),
+        return_exceptions=True,
+    )
+    for public_id, result in zip(public_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to clean up uploaded image {public_id}: {result}")
+
+def _exists(db: Session, model, entity_id: Optional[int]) -> bool:
+    return entity_id is not None and db.get(model, entity_id) is not None
+
+def _images_by_hash(db: Session, digests: List[str]) -> Dict[str, List[Image]]:
+    found: Dict[str, List[Image]] = {}
+    for image in db.execute(select(Image).where(Image.content_hash.in_(digests))).scalars():
+        found.setdefault(image.content_hash, []).append(image)
+    return found
+
+def _save_images(db: Session, images: List[Image]) -> List[Image]:
+    try:
+        db.add_all(images)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for db_image in images:
+        db.refresh(db_image)
+    return images
+
+async def upload_files(
+    uploads: List[Tuple[BinaryIO, str]],
+    concurrency: int = IMAGE_UPLOAD_CONCURRENCY,
+    db: Optional[Session] = None,
+) -> List[str]:
+    """Upload (file, public_id) pairs concurrently off the event loop and return their URLs.
+
+    If any upload fails, the ones that succeeded are deleted again before raising
+    (see _cleanup_uploads for db).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload_one(file: BinaryIO, public_id: str) -> str:
+        async with semaphore:
+            return await run_in_threadpool(uploader_module.uploader.upload, file, public_id)
+
+    results = await asyncio.gather(
+        *(upload_one(file, public_id) for file, public_id in uploads),
+        return_exceptions=True,
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        succeeded = [
+            public_id
+            for (_, public_id), result in zip(uploads, results)
+            if not isinstance(result, Exception)
+        ]
+        await _cleanup_uploads(succeeded, db)
+        raise failures[0]
+    return results
+
+async def store_images(
+    db: Session,
+    files: List[BinaryIO],
+    folder: str,
+    owner: Dict[str, int],
+) -> List[Image]:
+    """Store image files for one owner, deduplicated by SHA-256 of their content.
+
+    Content already attached to this owner returns the existing Image. Content stored
+    for someone else gets a new row pointing at the same remote object, without
+    re-uploading. Only new content is sent, with a locally generated thumbnail.
+    """
+    digests = await asyncio.gather(*(run_in_threadpool(_digest, file) for file in files))
+    known = await run_db(db, _images_by_hash, list(set(digests)))
+
+    images: Dict[str, Image] = {}
+    new_images: List[Image] = []
+    to_upload: List[Tuple[BinaryIO, Image]] = []
+    for file, digest in zip(files, digests):
+        if digest in images:
+            continue
+        matches = known.get(digest, [])
+        own = next(
+            (image for image in matches if all(getattr(image, column) == owner.get(column) for column in OWNER_COLUMNS)),
+            None,
+        )
+        if own is not None:
+            images[digest] = own
+            continue
+        if matches:
+            source = matches[0]
+            image = Image(
+                image_url=source.image_url,
+                thumbnail_url=source.thumbnail_url,
+                public_id=source.public_id,
+                content_hash=digest,
+                **owner,
+            )
+        else:
+            image = Image(public_id=f"{folder}/{digest}", content_hash=digest, **owner)
+            to_upload.append((file, image))
+        images[digest] = image
+        new_images.append(image)
+
+    if to_upload:
+        thumbnails = await asyncio.gather(*(_make_variant(file) for file, _ in to_upload))
+        uploads = [(file, image.public_id) for file, image in to_upload]
+        uploads += [
+            (io.BytesIO(thumbnail), image.public_id + THUMBNAIL_SUFFIX)
+            for (_, image), thumbnail in zip(to_upload, thumbnails)
+            if thumbnail
+        ]
+        urls = dict(zip((public_id for _, public_id in uploads), await upload_files(uploads, db=db)))
+        for _, image in to_upload:
+            image.image_url = urls[image.public_id]
+            image.thumbnail_url = urls.get(image.public_id + THUMBNAIL_SUFFIX)
+    else:
+        uploads = []
+
+    if new_images:
+        try:
+            # Every new row is written in a single transaction
+            await run_db(db, _save_images, new_images)
+        except Exception:
+            await _cleanup_uploads([public_id for _, public_id in uploads], db)
+            raise
+    return [images[digest] for digest in digests]
+
 async def create_single_image(
     db: Session,
     file: UploadFile,
@@ -18,8 +256,8 @@ async def create_single_image(
     category_id: Optional[int] = None
 ) -> Image:
     try:
-        # Validate file type
-        if not file.content_type.startswith("image/"):
+        # Validate file type from the bytes, not the client-supplied content type
+        if not await sniff_image_type(file):
             logger.error(f"Invalid file type uploaded: {file.content_type}")
             raise HTTPException(status_code=400, detail="File must be an image")
 
@@ -34,52 +272,29 @@ async def create_single_image(
 
         # Validate entity existence
         if user_id:
-            if not db.query(User).filter(User.id == user_id).first():
+            if not await run_db(db, _exists, User, user_id):
                 logger.error(f"User with ID {user_id} not found")
                 raise HTTPException(status_code=404, detail="User not found")
         elif category_id:
-            if not db.query(Category).filter(Category.id == category_id).first():
+            if not await run_db(db, _exists, Category, category_id):
                 logger.error(f"Category with ID {category_id} not found")
                 raise HTTPException(status_code=404, detail="Category not found")
 
-        # Generate a unique public ID
-        unique_id = str(uuid.uuid4())
         folder = "images" 
         if user_id:
             folder = f"users/{user_id}"
+            owner = {"user_id": user_id}
         elif category_id:
             folder = f"categories/{category_id}"
-        public_id = f"{folder}/{unique_id}_{file.filename}"
-
-        # Upload image to Cloudinary
-        upload_result = cloudinary.uploader.upload(
-            file.file,
-            folder=folder,
-            public_id=public_id,
-            unique_filename=False,
-            overwrite=True
-        )
+            owner = {"category_id": category_id}
 
-        # Get the secure URL
-        image_url = upload_result.get("secure_url")
-        if not image_url:
-            logger.error("Failed to retrieve image URL from Cloudinary")
-            raise HTTPException(status_code=500, detail="Failed to upload image")
-
-        # Save to database
-        db_image = Image(
-            image_url=image_url,
-            public_id=public_id,
-            user_id=user_id,
-            category_id=category_id
-        )
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
+        [db_image] = await store_images(db, [file.file], folder, owner)
 
-        logger.info(f"Single Image uploaded successfully: {image_url}")
+        logger.info(f"Single Image uploaded successfully: {db_image.image_url}")
         return db_image
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading single image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error uploading image: {str(e)}")
@@ -92,51 +307,34 @@ async def create_multiple_images(
 ) -> List[Image]:
     try:
         # Validate that only one ID is provided
-        if not db.query(Product).filter(Product.id == product_id).first():
+        if not await run_db(db, _exists, Product, product_id):
             logger.error(f"Product not with ID {product_id} not found")
             raise HTTPException(status_code=404, detail="Product not found")
 
-        uploaded_images = []
         folder = "uploads"
        
         if product_id:
             folder = f"products/{product_id}"
-     
+
+        # Validate every file before sending anything to Cloudinary
         for file in files:
-            if not file.content_type.startswith("image/"):
+            if not await sniff_image_type(file):
                 logger.error(f"Invalid file type uploaded: {file.content_type}")
                 raise HTTPException(status_code=400, detail=f"File {file.filename} must be an image")
 
-            unique_id = str(uuid.uuid4())
-            public_id = f"product_id={folder}/{product_id}/{unique_id}_{file.filename}"
-            upload_result = cloudinary.uploader.upload(
-                file.file,
-                folder=folder,
-                public_id=public_id,
-                unique_filename=False,
-                overwrite=True
+        try:
+            uploaded_images = await store_images(
+                db, [file.file for file in files], folder, {"product_id": product_id}
             )
-
-            image_url = upload_result.get("secure_url")
-            if not image_url:
-                logger.error(f"Failed to retrieve image URL for {file.filename}")
-                raise HTTPException(status_code=500, detail=f"Failed to upload {file.filename}")
-
-            db_image = Image(
-                image_url=image_url,
-                public_id=public_id,
-                product_id=product_id,
-            )
-            db.add(db_image)
-            uploaded_images.append(db_image)
-
-        db.commit()
-        for db_image in uploaded_images:
-            db.refresh(db_image)
+        except Exception as e:
+            logger.error(f"Failed to upload images for product_id {product_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to upload images: {str(e)}")
 
         logger.info(f"Successfully uploaded {len(uploaded_images)} images for product_id: {product_id}")
         return uploaded_images
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading images: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error uploading images: {str(e)}")
\ No newline at end of file
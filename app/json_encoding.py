@@ -0,0 +1,27 @@
+import json
+from datetime import date, datetime
+from typing import Any
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
+
+class FastJSONResponse(Response):
+    """JSON response for data that is already plain dicts/lists; skips response_model validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
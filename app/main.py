@@ -1,17 +1,33 @@
 import cloudinary
 import logging
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, UploadFile, File
+import time
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import inspect
+import os
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime
 from typing import Optional, List
-from app.schemas.users_schema import UserCreate, UserResponse
-from app.schemas.categories_schema import CategoryCreate, CategoryResponse, ProductCreate, ProductResponse, ProductUpdate
+from app.schemas.users_schema import UserCreate, UserResponse, Token
+from app.schemas.categories_schema import CategoryCreate, CategoryResponse, CategoryWithProducts, ProductCreate, ProductResponse, ProductUpdate, ProductWithImages, ProductBatchUpdate, BatchUpdateReport, ImportReport, ProductFacets
 from app.schemas.image_schema import ImageResponse
-from app.users import create_user
-from app.categories import create_category, get_all_categories, get_category, create_product, update_product, get_product, get_all_products
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from app.users import create_user, hash_password
+from app.auth import login, authenticate_token
+from app.categories import create_category, get_all_categories, get_category, create_product, update_product, update_products, get_product, get_all_products, get_product_rows, resolve_fields, search_products, get_product_images, with_images, product_version, products_version, category_version, categories_version, CATEGORY_SORTS, PRODUCT_SORTS
 from app.image import create_single_image, create_multiple_images
-from app.database import engine, SessionLocal, Base
+from app.product_import import import_products, detect_format, DEFAULT_BATCH_SIZE
+from app.product_export import iter_products, aiter_products, export_watermark, MEDIA_TYPES
+from app.database import SessionLocal, AsyncSessionLocal, DB_ASYNC, get_engine, on_engine_created, run_db, run_db_offloaded
+from app.migrate import check_ready, migrate
+from app.pagination import next_cursor
+from app.json_encoding import FastJSONResponse
+from app.conditional import not_modified
+from app.replicas import DATABASE_REPLICA_URLS, ReadAsyncSessionLocal, ReadSessionLocal, TrackWritesMiddleware, reads_from_primary, run_read
+from app.upload_limits import UploadAdmissionMiddleware, form_files, multipart_schema
+from app import cache, metrics, profiling, suggest
+from app.facets import get_facets
 
 load_dotenv()
 
@@ -20,96 +36,383 @@ logger = logging.getLogger(__name__)
 
 config = cloudinary.config(secure=True)
 
-try:
-    Base.metadata.create_all(bind=engine)
-    inspector = inspect(engine)
-    if 'categories' in inspector.get_table_names() and 'products' in inspector.get_table_names():
-        logger.info("Database tables 'categories' and 'products' verified/created successfully")
-    else:
-        logger.error("Database tables not found after creation attempt")
-        raise Exception("Table creation failed")
-except Exception as e:
-    logger.error(f"Failed to create/verify database tables: {str(e)}")
-    raise
+# Schema changes run via `python -m app.migrate`; set this to also run them on startup
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
 
 app = FastAPI()
+app.add_middleware(UploadAdmissionMiddleware, path_prefix="/upload-image/")
+
+@app.on_event("startup")
+async def migrate_on_startup():
+    if DB_MIGRATE_ON_STARTUP:
+        try:
+            await run_in_threadpool(migrate, get_engine())
+        except Exception as e:
+            logger.error(f"Failed to create/verify database tables: {str(e)}")
+            raise
+
+@app.on_event("startup")
+async def start_suggest_index():
+    if suggest.SUGGEST_INDEX:
+        suggest.start(get_engine())
+
+@app.on_event("shutdown")
+async def stop_suggest_index():
+    suggest.stop()
+
+def _instrument_engine(engine, name):
+    metrics.instrument_engine(engine)
+    profiling.instrument_engine(engine)
+    metrics.register_pool(engine, name)
+
+on_engine_created(_instrument_engine)
+metrics.CallbackCounter("cache_hits_total", "Read-through cache hits", lambda: cache.cache.hits)
+metrics.CallbackCounter("cache_misses_total", "Read-through cache misses", lambda: cache.cache.misses)
+metrics.CallbackCounter("cache_evictions_total", "Read-through cache evictions", lambda: cache.cache.evictions)
+metrics.Gauge("suggest_index_products", "Products in the typeahead index", lambda: suggest.suggest_index.size)
+
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Replica routing: a client's reads stick to the primary briefly after it writes
+if DATABASE_REPLICA_URLS:
+    app.add_middleware(TrackWritesMiddleware)
+
+# Opt-in per-request SQL profile (SQL_PROFILE=1): Server-Timing header and a structured log line
+app.add_middleware(profiling.ProfileMiddleware)
+
+if DB_ASYNC:
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Read-only catalog endpoints: a replica when DATABASE_REPLICA_URLS is set, else the primary
+if DB_ASYNC:
+    async def get_read_db(request: Request):
+        async with ReadAsyncSessionLocal(use_primary=reads_from_primary(request)) as db:
+            yield db
+else:
+    def get_read_db(request: Request):
+        db = ReadSessionLocal(use_primary=reads_from_primary(request))
+        try:
+            yield db
+        finally:
+            db.close()
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def get_db():
-    db = SessionLocal()
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserResponse:
+    return await authenticate_token(db, token)
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness(response: Response, db: Session = Depends(get_db)):
     try:
-        yield db
-    finally:
-        db.close()
+        await run_db(db, check_ready)
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        response.status_code = 503
+        return {"status": "unavailable"}
+    return {"status": "ok"}
 
 @app.post("/users/", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    return create_user(db=db, user=user)
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+    hashed_password = await hash_password(user.password)
+    return await run_db(db, create_user, user=user, hashed_password=hashed_password)
+
+@app.post("/auth/token", response_model=Token)
+async def login_endpoint(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    return await login(db, email=form.username, password=form.password)
+
+@app.get("/users/me", response_model=UserResponse)
+async def read_current_user(current_user: UserResponse = Depends(get_current_user)):
+    return current_user
 
 @app.post("/categories/", response_model=CategoryResponse)
-def add_category(category: CategoryCreate, db: Session = Depends(get_db)):
-    return create_category(db=db, category=category)
+async def add_category(category: CategoryCreate, db: Session = Depends(get_db)):
+    return await run_db(db, create_category, category=category)
 
-@app.get("/categories/", response_model=List[CategoryResponse])
-def get_all_categories_endpoint(
+@app.get("/categories/", response_model=List[CategoryWithProducts], response_model_exclude_unset=True)
+async def get_all_categories_endpoint(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    include: Optional[str] = Query(None, regex="^products$"),
+    per_category: int = Query(4, ge=1, le=50),
+    db: Session = Depends(get_read_db)
 ):
-    return get_all_categories(db=db, skip=skip, limit=limit)
+    version = await run_read(db, categories_version, include_products=include == "products")
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+
+    categories = await run_read(
+        db,
+        get_all_categories,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+        include_products=include == "products",
+        per_category=per_category,
+        version=version,
+    )
+    cursor = next_cursor(categories, limit, sort, CATEGORY_SORTS[sort])
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return categories
 
 @app.get("/categories/{id}", response_model=CategoryResponse)
-def get_category_endpoint(
+async def get_category_endpoint(
     id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
 ):
-    return get_category(db=db, category_id=id)
+    version = await run_read(db, category_version, category_id=id)
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+    return await run_read(db, get_category, category_id=id, version=version)
 
 @app.post("/products/", response_model=ProductResponse)
-def add_product(product: ProductCreate, db: Session = Depends(get_db)):
-    return create_product(db=db, product=product)
+async def add_product(product: ProductCreate, db: Session = Depends(get_db)):
+    return await run_db(db, create_product, product=product)
+
+@app.post("/products/import", response_model=ImportReport)
+async def import_products_endpoint(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    # CSV parsing and validation are CPU work: keep them off the event loop in async mode too
+    return await run_db_offloaded(
+        db,
+        import_products,
+        stream=file.file,
+        fmt=format or detect_format(file.filename, file.content_type),
+        batch_size=batch_size,
+    )
 
-@app.get("/products/", response_model=List[ProductResponse])
-def get_all_products_endpoint(
+@app.get("/products/", response_model=List[ProductWithImages], response_model_exclude_unset=True)
+async def get_all_products_endpoint(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    fields: Optional[str] = Query(None, description="'summary' or a comma-separated list of product fields"),
+    include: Optional[str] = Query(None, regex="^images$"),
+    db: Session = Depends(get_read_db)
+):
+    version = await run_read(db, products_version, include_images=include == "images")
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+
+    if fields:
+        # Lean listing: only the requested columns, encoded straight to JSON bytes
+        names = resolve_fields(fields)
+        rows = await run_read(db, get_product_rows, fields=names, skip=skip, limit=limit, cursor=cursor, sort=sort)
+        headers = dict(response.headers)
+        cursor = next_cursor(rows, limit, sort, PRODUCT_SORTS[sort])
+        if cursor:
+            headers["X-Next-Cursor"] = cursor
+        return FastJSONResponse([{name: row._mapping[name] for name in names} for row in rows], headers=headers)
+
+    products = await run_read(db, get_all_products, skip=skip, limit=limit, cursor=cursor, sort=sort)
+    cursor = next_cursor(products, limit, sort, PRODUCT_SORTS[sort])
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    if include == "images":
+        return await run_read(db, with_images, products)
+    return products
+
+@app.get("/products/suggest")
+async def suggest_products_endpoint(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+):
+    # Answered from the in-process index without touching the database
+    if not suggest.SUGGEST_INDEX:
+        raise HTTPException(status_code=404, detail="Suggestions are disabled (SUGGEST_INDEX)")
+    if not suggest.suggest_index.ready:
+        raise HTTPException(status_code=503, detail="Suggestions are not ready yet", headers={"Retry-After": "5"})
+    return FastJSONResponse(suggest.suggest_index.suggest(q, limit))
+
+@app.get("/products/facets", response_model=ProductFacets)
+async def get_product_facets_endpoint(
+    request: Request,
+    response: Response,
+    category_id: Optional[int] = None,
+    color: Optional[str] = None,
+    price_bucket: Optional[int] = Query(None, ge=-1),
+    min_rating: Optional[int] = Query(None, ge=0, le=5),
+    in_stock: Optional[bool] = None,
+    db: Session = Depends(get_read_db)
+):
+    version = await run_read(db, products_version)
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+
+    return await run_read(
+        db,
+        get_facets,
+        category_id=category_id,
+        color=color,
+        price_bucket=price_bucket,
+        min_rating=min_rating,
+        in_stock=in_stock,
+        version=version,
+    )
+
+@app.get("/products/search", response_model=List[ProductWithImages], response_model_exclude_unset=True)
+async def search_products_endpoint(
+    request: Request,
+    response: Response,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    color: Optional[str] = None,
+    colors: Optional[List[str]] = Query(None),
+    tags: Optional[List[str]] = Query(None),
+    min_rating: Optional[float] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    include: Optional[str] = Query(None, regex="^images$"),
+    db: Session = Depends(get_read_db)
+):
+    version = await run_read(db, products_version, include_images=include == "images")
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+
+    products = await run_read(
+        db,
+        search_products,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        color=color,
+        colors=colors,
+        tags=tags,
+        min_rating=min_rating,
+        limit=limit,
+        cursor=cursor,
+        sort=sort,
+    )
+    cursor = next_cursor(products, limit, sort, PRODUCT_SORTS[sort])
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    if include == "images":
+        return await run_read(db, with_images, products)
+    return products
+
+@app.get("/products/export")
+async def export_products_endpoint(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    updated_since: Optional[datetime] = None,
     db: Session = Depends(get_db)
 ):
-    return get_all_products(db=db, skip=skip, limit=limit)
+    # Clients pass this back as updated_since on their next incremental run; it trails the
+    # export by a grace period, so rows may be sent twice but never skipped
+    headers = {"X-Export-Watermark": export_watermark().isoformat()}
+    if DB_ASYNC:
+        rows = aiter_products(db, fmt=format, updated_since=updated_since)
+    else:
+        rows = iter_products(db, fmt=format, updated_since=updated_since)
+    return StreamingResponse(rows, media_type=MEDIA_TYPES[format], headers=headers)
 
+@app.patch("/products/batch", response_model=BatchUpdateReport)
+async def update_products_endpoint(
+    batch: ProductBatchUpdate,
+    db: Session = Depends(get_db)
+):
+    return await run_db(db, update_products, batch=batch)
 
-@app.get("/products/{id}", response_model=ProductResponse)
-def get_product_endpoint(
+@app.get("/products/{id}", response_model=ProductWithImages, response_model_exclude_unset=True)
+async def get_product_endpoint(
     id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, regex="^images$"),
+    db: Session = Depends(get_read_db)
+):
+    version = await run_read(db, product_version, product_id=id, include_images=include == "images")
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+
+    product = await run_read(db, get_product, product_id=id, version=version)
+    if include == "images":
+        [product] = await run_read(db, with_images, [product])
+    return product
+
+@app.get("/products/{id}/images", response_model=List[ImageResponse])
+async def get_product_images_endpoint(
+    id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
 ):
-    return get_product(db=db, product_id=id)
+    version = await run_read(db, product_version, product_id=id, include_images=True)
+    cached_response = not_modified(request, response, version)
+    if cached_response:
+        return cached_response
+    return await run_read(db, get_product_images, product_id=id, version=version)
 
 @app.put("/products/{id}", response_model=ProductResponse)
-def update_product_endpoint(
+async def update_product_endpoint(
     id: int,
     product: ProductUpdate,
     db: Session = Depends(get_db)
 ):
-    return update_product(db=db, product_id=id, product=product)
+    return await run_db(db, update_product, product_id=id, product=product)
 
-@app.post("/upload-image/single/", response_model=ImageResponse)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats_endpoint():
+    return cache.cache.stats()
+
+@app.post("/upload-image/single/", response_model=ImageResponse, openapi_extra=multipart_schema("file", multiple=False))
 async def upload_single_image(
-    file: UploadFile = File(...),
     user_id: Optional[int] = None,
     category_id: Optional[int] = None,
+    files: List[UploadFile] = Depends(form_files("file")),
     db: Session = Depends(get_db)
 ):
     return await create_single_image(
     db=db,
-    file=file,
+    file=files[0],
     user_id=user_id,
     category_id=category_id,
 )
 
-@app.post("/upload-image/multiple/", response_model=List[ImageResponse])
+@app.post("/upload-image/multiple/", response_model=List[ImageResponse], openapi_extra=multipart_schema("files", multiple=True))
 async def upload_multiple_images(
-    files: List[UploadFile] = File(...),
     product_id: int = None,
+    files: List[UploadFile] = Depends(form_files("files")),
     db: Session = Depends(get_db)
 ):
     return await create_multiple_images(
@@ -0,0 +1,194 @@
+import bisect
+import contextvars
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Minimal Prometheus text-format metrics; no client library needed for a handful of series
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REGISTRY: List["Metric"] = []
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+Reading = Union[Optional[float], Dict[Tuple[str, ...], float]]
+
+class Gauge(Metric):
+    """Gauge read from a callback at scrape time.
+
+    With labelnames, the callback returns a dict of label values to value.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Reading], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        if self.labelnames:
+            return [f"{self.name}{_labels(self.labelnames, key)} {series}" for key, series in value.items()]
+        return [] if value is None else [f"{self.name} {value}"]
+
+class CallbackCounter(Gauge):
+    """Counter read from a callback at scrape time; the value must only ever increase."""
+
+    kind = "counter"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    labelnames=("method", "route", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request",
+    labelnames=("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+# Connection pools by engine name ("db", "db_async", "replica0", ...), one label value each
+_POOLS: Dict[str, QueuePool] = {}
+
+def _pool_gauge(name: str, help: str, read: Callable[[QueuePool], float]) -> Gauge:
+    return Gauge(name, help, lambda: {(pool_name,): read(pool) for pool_name, pool in _POOLS.items()}, ("pool",))
+
+_pool_gauge("db_pool_size", "Configured pool size", lambda pool: pool.size())
+_pool_gauge("db_pool_checked_out", "Connections currently checked out", lambda pool: pool.checkedout())
+_pool_gauge("db_pool_overflow", "Connections open beyond pool_size", lambda pool: max(pool.overflow(), 0))
+_pool_gauge("db_pool_checked_in", "Idle connections in the pool", lambda pool: pool.checkedin())
+
+def register_pool(engine: Engine, name: str) -> None:
+    if isinstance(engine.pool, QueuePool):
+        _POOLS[name] = engine.pool
+
+# Mutable per-request counter; threadpool workers and run_sync share the same object
+_query_count: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("query_count", default=None)
+
+def start_query_count() -> list:
+    counter = [0]
+    _query_count.set(counter)
+    return counter
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter = _query_count.get()
+        if counter is not None:
+            counter[0] += 1
+
+class MetricsMiddleware:
+    """Request latency and SQL statement count per route, as a plain ASGI middleware."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = start_query_count()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # Label by route template, not raw path, to keep series cardinality bounded
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], path, str(status))
+            REQUEST_QUERIES.observe(queries[0], scope["method"], path)
@@ -0,0 +1,91 @@
+import argparse
+import logging
+from sqlalchemy import Column, Table, func, inspect, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+from app.categories import recount_products
+from app.facets import recount_facets
+from app.database import Base, get_engine
+from app.models.categories_model import Category, Product
+import app.models.categories_model  # noqa: F401  register tables on Base.metadata
+import app.models.image_model  # noqa: F401
+import app.models.users_model  # noqa: F401
+
+# Recomputed when the column (or, keyed by None, the table) is first added, so existing rows start out correct
+BACKFILLS = {
+    ("categories", "updated_at"): lambda conn: conn.execute(update(Category).values(updated_at=Category.created_at)),
+    ("categories", "product_count"): recount_products,
+    ("products", "updated_at"): lambda conn: conn.execute(
+        update(Product).values(updated_at=func.coalesce(Product.created_at, func.current_timestamp()))
+    ),
+    ("product_facets", None): recount_facets,
+}
+
+logger = logging.getLogger(__name__)
+
+def migrate(engine: Engine) -> None:
+    """Bring the database up to the current models.
+
+    Creates missing tables, adds missing columns to existing tables and creates any
+    missing indexes. It never drops or alters existing columns.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+        existing_tables = set(inspect(conn).get_table_names())
+        Base.metadata.create_all(bind=conn)
+
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    logger.info(f"Adding column {table.name}.{column.name}")
+                    add_column(conn, table, column)
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+        # Tables added to an existing database are filled once every column is in place
+        for table in Base.metadata.sorted_tables:
+            backfill = BACKFILLS.get((table.name, None))
+            if existing_tables and table.name not in existing_tables and backfill:
+                logger.info(f"Filling new table {table.name}")
+                backfill(conn)
+
+    logger.info("Database schema is up to date")
+
+def add_column(conn: Connection, table: Table, column: Column) -> None:
+    backfill = BACKFILLS.get((table.name, column.name))
+    if column.nullable or column.server_default is not None:
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"))
+        if backfill:
+            backfill(conn)
+        return
+
+    # NOT NULL with no server default can't be added to a table with rows: add it
+    # nullable, fill it, then tighten it (SQLite can't, so there it stays nullable)
+    default = column.default
+    if backfill is None and not (default is not None and (default.is_scalar or default.is_callable)):
+        raise RuntimeError(f"{table.name}.{column.name} is NOT NULL without a default: add it to BACKFILLS")
+    loose = column._copy()
+    loose.nullable = True
+    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(loose).compile(dialect=conn.dialect)}"))
+    if backfill:
+        backfill(conn)
+    else:
+        conn.execute(update(table).values({column.name: default.arg if default.is_scalar else default.arg(None)}))
+    if conn.dialect.name != "sqlite":
+        conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} SET NOT NULL"))
+
+def check_ready(db: Session) -> None:
+    """Readiness probe: the database answers a trivial query."""
+    db.execute(text("SELECT 1"))
+
+def main() -> None:
+    argparse.ArgumentParser(description="Create or upgrade the database schema").parse_args()
+    migrate(get_engine())
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,30 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, ARRAY, JSON, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, JSON, Boolean, Index, DDL, event
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
 
+# Postgres stores lists natively; SQLite (local runs and tests) falls back to JSON
+StringArray = ARRAY(String).with_variant(JSON, "sqlite")
+
 class Category(Base):
     __tablename__ = "categories"
     
     id = Column(Integer, primary_key=True, index=True)
     category_name = Column(String, nullable=False, unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every UPDATE, including product_count changes; drives ETag/Last-Modified
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     image_link = Column(String, nullable=True)
+    # Maintained by create_product/update_product so listings never COUNT(*) products
+    product_count = Column(Integer, nullable=False, default=0, server_default="0")
     products = relationship("Product", back_populates="category")
 
+    # Keyset pagination indexes: every sort is (column, id)
+    __table_args__ = (
+        Index("ix_categories_created_at_id", "created_at", "id"),
+    )
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -20,15 +33,59 @@ class Product(Base):
     price = Column(Float)
     old_price = Column(Float, nullable=True)
     category_id = Column(Integer, ForeignKey("categories.id"))
-    color = Column(String, nullable=True)
-    colors = Column(ARRAY(String), nullable=True)
+    color = Column(String, nullable=True, index=True)
+    colors = Column(StringArray, nullable=True)
     rating = Column(Float, nullable=True)
     review_count = Column(Integer, nullable=True)
     description = Column(String, nullable=True)
-    features = Column(ARRAY(String), nullable=True)
+    features = Column(StringArray, nullable=True)
     specifications = Column(JSON, nullable=True)
     tags = Column(String, nullable=True)
     in_stock = Column(Boolean, default=True)
     image_link = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     category = relationship("Category", back_populates="products")
+
+    # Keyset pagination indexes: every sort is (column, id)
+    __table_args__ = (
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_rating_id", "rating", "id"),
+        # Category filters and the per-category top-N window
+        Index("ix_products_category_id_id", "category_id", "id"),
+        # Search filters, Postgres-only: elsewhere the partial index would duplicate
+        # ix_products_price_id, and plain btrees can't serve JSON membership or '%tag%'
+        Index("ix_products_in_stock_price", "price", "id", postgresql_where=in_stock.is_(True)).ddl_if(dialect="postgresql"),
+        Index("ix_products_colors", "colors", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_tags_trgm",
+            "tags",
+            postgresql_using="gin",
+            postgresql_ops={"tags": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# The trigram index on tags needs pg_trgm before the table is created
+event.listen(
+    Product.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+class ProductFacet(Base):
+    """Precomputed product counts per facet cell, maintained by app.facets alongside product writes."""
+    __tablename__ = "product_facets"
+
+    # 0 stands for "no category"; -1 for an unset price or rating
+    category_id = Column(Integer, primary_key=True, autoincrement=False)
+    price_bucket = Column(Integer, primary_key=True, autoincrement=False)
+    rating_band = Column(Integer, primary_key=True, autoincrement=False)
+    in_stock = Column(Boolean, primary_key=True)
+    # "" rows count each product once; every color it comes in has a row of its own
+    color = Column(String, primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_product_facets_color", "color"),
+    )
@@ -1,5 +1,5 @@
 # app/models/image.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from app.database import Base
 from datetime import datetime
 
@@ -9,7 +9,15 @@ class Image(Base):
     id = Column(Integer, primary_key=True, index=True)
     image_url = Column(String, nullable=False)
     public_id = Column(String, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True) 
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)  
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)  
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    thumbnail_url = Column(String, nullable=True)
+    # SHA-256 of the original bytes; identical uploads share one stored object
+    content_hash = Column(String(64), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves the product_id IN (...) gallery lookups already in id order
+        Index("ix_images_product_id_id", "product_id", "id"),
+    )
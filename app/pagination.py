@@ -0,0 +1,126 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+
+# A sort option is (column, descending). Ties are broken on the primary key in the
+# same direction, so every order has a matching (column, id) btree index; a unique
+# column has no ties and is served by its own unique index. NULLs sort last either way.
+SortSpec = Tuple[ColumnElement, bool]
+
+def resolve_sort(sorts: Dict[str, SortSpec], sort: str) -> SortSpec:
+    if sort not in sorts:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort '{sort}'. Allowed: {', '.join(sorts)}",
+        )
+    return sorts[sort]
+
+def encode_cursor(sort: str, value: Any, last_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "v": value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload["s"] != sort:
+            raise ValueError("cursor was issued for a different sort")
+        return payload["v"], int(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+_START = object()
+
+def _coerce(column: ColumnElement, value: Any) -> Any:
+    if value is not None and column.type.python_type is datetime:
+        return datetime.fromisoformat(value)
+    return value
+
+def _segments(stmt: Select, id_column: ColumnElement, spec: SortSpec, value: Any = _START, last_id: Optional[int] = None) -> List[Select]:
+    """The page query split so each part is one range scan of the (column, id) index.
+
+    A nullable column is read in two segments: its values, then its NULLs by id. An OR
+    between the two in one query would stop the planner from using the index for either.
+    value/last_id is the cursor position; _START means the beginning of the values.
+    """
+    column, descending = spec
+
+    def after(key, last):
+        return key < last if descending else key > last
+
+    def ordered(*columns):
+        return [c.desc() if descending else c.asc() for c in columns]
+
+    if column is id_column or (column.unique and not column.nullable):
+        # No ties to break: the column's own index gives the order
+        if value is not _START:
+            stmt = stmt.where(after(column, value))
+        return [stmt.order_by(*ordered(column))]
+
+    segments = []
+    if value is not None:
+        values = stmt.order_by(*ordered(column, id_column))
+        if column.nullable:
+            values = values.where(column.is_not(None))
+        if value is not _START:
+            values = values.where(after(tuple_(column, id_column), tuple_(value, last_id)))
+        segments.append(values)
+    if column.nullable:
+        nulls = stmt.where(column.is_(None)).order_by(*ordered(id_column))
+        if value is None:
+            nulls = nulls.where(after(id_column, last_id))
+        segments.append(nulls)
+    return segments
+
+def paginate(
+    db: Session,
+    stmt: Select,
+    id_column: ColumnElement,
+    sort_name: str,
+    spec: SortSpec,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    scalars: bool = True,
+) -> list:
+    """One page of stmt in sort order, after the cursor or (for older clients) skip rows.
+
+    skip is ignored when a cursor is given: the cursor alone says where the page starts.
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_name)
+        segments = _segments(stmt, id_column, spec, _coerce(spec[0], value), last_id)
+        skip = 0
+    else:
+        segments = _segments(stmt, id_column, spec)
+
+    rows = []
+    for segment in segments:
+        if skip:
+            page = db.execute(segment.offset(skip).limit(limit - len(rows))).all()
+            if not page:
+                # The offset reaches past this segment: carry the rest into the next one
+                skip -= db.execute(select(func.count()).select_from(segment.order_by(None).subquery())).scalar()
+                continue
+            skip = 0
+        else:
+            page = db.execute(segment.limit(limit - len(rows))).all()
+        rows.extend(page)
+        if len(rows) >= limit:
+            break
+    return [row[0] for row in rows] if scalars else rows
+
+def next_cursor(items: list, limit: int, sort_name: str, spec: SortSpec) -> Optional[str]:
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    column, _ = spec
+    return encode_cursor(sort_name, getattr(last, column.key), last.id)
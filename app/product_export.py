@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterator, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.categories_model import Product
+from app.product_import import CSV_JSON_FIELDS, CSV_LIST_FIELDS
+from app.schemas.categories_schema import ProductResponse
+
+EXPORT_BATCH_SIZE = 1000
+# How far the watermark trails the export's start. updated_at is set by the writing worker's
+# clock before its transaction commits, so a write can land after the export's snapshot with
+# an earlier timestamp; the grace period must exceed clock skew plus the longest write
+EXPORT_WATERMARK_GRACE_SECONDS = float(os.getenv("EXPORT_WATERMARK_GRACE_SECONDS", "300"))
+EXPORT_FIELDS = list(ProductResponse.__fields__)
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def export_watermark() -> datetime:
+    """updated_since for the client's next incremental run.
+
+    Trails the export's start by EXPORT_WATERMARK_GRACE_SECONDS, so consecutive runs
+    overlap: delivery is at-least-once and clients should upsert by id.
+    """
+    return datetime.utcnow() - timedelta(seconds=EXPORT_WATERMARK_GRACE_SECONDS)
+
+def export_stmt(updated_since: Optional[datetime] = None):
+    stmt = select(Product).order_by(Product.id)
+    if updated_since is not None:
+        stmt = stmt.where(Product.updated_at >= updated_since)
+    # yield_per streams through a server-side cursor instead of buffering the result
+    return stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+def _csv_line(values: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+def csv_header() -> str:
+    return _csv_line(EXPORT_FIELDS)
+
+def serialize(product: Product, fmt: str) -> str:
+    row = ProductResponse.from_orm(product)
+    if fmt == "ndjson":
+        return row.json() + "\n"
+    # Same cell conventions as the CSV importer, so exports can be re-imported
+    data = row.dict()
+    values = []
+    for field in EXPORT_FIELDS:
+        value = data[field]
+        if value is None:
+            value = ""
+        elif field in CSV_LIST_FIELDS:
+            value = "|".join(value)
+        elif field in CSV_JSON_FIELDS:
+            value = json.dumps(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    return _csv_line(values)
+
+def serialize_batch(products: List[Product], fmt: str) -> str:
+    return "".join(serialize(product, fmt) for product in products)
+
+def iter_products(db: Session, fmt: str = "ndjson", updated_since: Optional[datetime] = None) -> Iterator[str]:
+    if fmt == "csv":
+        yield csv_header()
+    for product in db.execute(export_stmt(updated_since)).scalars():
+        yield serialize(product, fmt)
+
+async def aiter_products(
+    db: AsyncSession,
+    fmt: str = "ndjson",
+    updated_since: Optional[datetime] = None,
+) -> AsyncIterator[str]:
+    if fmt == "csv":
+        yield csv_header()
+    result = await db.stream_scalars(export_stmt(updated_since))
+    # Rows are fetched on the event loop; serialising them is CPU work for the threadpool
+    async for products in result.partitions(EXPORT_BATCH_SIZE):
+        yield await run_in_threadpool(serialize_batch, products, fmt)
@@ -0,0 +1,176 @@
+import argparse
+import csv
+import io
+import json
+import logging
+from collections import Counter
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.categories import adjust_product_counts, invalidate_categories, product_row, upsert_categories
+from app.facets import adjust_facets, facet_deltas
+from app.models.categories_model import Product
+from app.schemas.categories_schema import ImportReport, ImportRowError, ProductCreate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# CSV cells are flat strings: list columns are "|"-separated, specifications is JSON
+CSV_LIST_FIELDS = ("colors", "features")
+CSV_JSON_FIELDS = ("specifications",)
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return "csv"
+
+def _csv_row(row: Dict[str, str]) -> dict:
+    data = {}
+    for key, value in row.items():
+        if key is None or value is None or value.strip() == "":
+            continue
+        value = value.strip()
+        if key in CSV_LIST_FIELDS:
+            data[key] = [item.strip() for item in value.split("|") if item.strip()]
+        elif key in CSV_JSON_FIELDS:
+            data[key] = json.loads(value)
+        else:
+            data[key] = value
+    return data
+
+def iter_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (row_number, dict) one row at a time; unparsable rows yield the exception."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "ndjson":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, e
+    else:
+        # Row numbers count the header as row 1, matching what spreadsheets show
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            try:
+                yield number, _csv_row(row)
+            except ValueError as e:
+                yield number, e
+
+class ProductImporter:
+    def __init__(self, db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self._batch: List[Tuple[int, ProductCreate]] = []
+
+    def _error(self, row: int, error: str) -> None:
+        self.report.failed += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(ImportRowError(row=row, error=error))
+
+    def add(self, row: int, data: object) -> None:
+        if isinstance(data, Exception):
+            self._error(row, f"Unparsable row: {data}")
+            return
+        try:
+            product = ProductCreate.parse_obj(data)
+        except ValidationError as e:
+            self._error(row, str(e).replace("\n", " "))
+            return
+        self._batch.append((row, product))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _resolve_categories(self, batch: List[Tuple[int, ProductCreate]]) -> None:
+        names = {product.category for _, product in batch if product.category and not product.category_id}
+        if names:
+            category_ids = upsert_categories(self.db, names)
+            for _, product in batch:
+                if product.category and not product.category_id:
+                    product.category_id = category_ids[product.category]
+
+    def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        try:
+            self._resolve_categories(batch)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            for row, _ in batch:
+                self._error(row, f"Failed to resolve category: {e}")
+            return
+
+        rows = [product_row(product) for _, product in batch]
+        try:
+            # One executemany per batch; SQLAlchemy sends it as multi-row INSERTs
+            self.db.execute(insert(Product), rows)
+            self._commit(rows)
+            return
+        except Exception:
+            self.db.rollback()
+
+        # Something in the batch is bad: isolate it row by row so the rest still lands
+        inserted = []
+        for (row, _), values in zip(batch, rows):
+            try:
+                with self.db.begin_nested():
+                    self.db.execute(insert(Product), [values])
+                inserted.append(values)
+            except Exception as e:
+                self._error(row, str(getattr(e, "orig", e)).strip())
+        self._commit(inserted)
+
+    def _commit(self, rows: List[dict]) -> None:
+        counts = Counter(values["category_id"] for values in rows)
+        adjust_product_counts(self.db, counts)
+        adjust_facets(self.db, facet_deltas([], rows))
+        self.db.commit()
+        self.report.imported += len(rows)
+        invalidate_categories()
+
+    def run(self, stream: IO[bytes], fmt: str) -> ImportReport:
+        for row, data in iter_rows(stream, fmt):
+            self.add(row, data)
+        self.flush()
+        logger.info(f"Product import finished: {self.report.imported} imported, {self.report.failed} failed")
+        return self.report
+
+def import_products(
+    db: Session,
+    stream: IO[bytes],
+    fmt: str = "csv",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> ImportReport:
+    return ProductImporter(db, batch_size=batch_size).run(stream, fmt)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk import products from CSV or NDJSON")
+    parser.add_argument("path", help="CSV or NDJSON file to import")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as stream:
+            report = import_products(
+                db,
+                stream,
+                fmt=args.format or detect_format(args.path),
+                batch_size=args.batch_size,
+            )
+    finally:
+        db.close()
+    print(report.json(indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: profile every request. capture_queries() turns it on while active regardless
+SQL_PROFILE = os.getenv("SQL_PROFILE", "false").lower() in ("1", "true", "yes")
+SQL_PROFILE_SLOWEST = int(os.getenv("SQL_PROFILE_SLOWEST", "3"))
+# The same statement shape this many times in one request is reported as a probable N+1
+SQL_PROFILE_REPEAT_THRESHOLD = int(os.getenv("SQL_PROFILE_REPEAT_THRESHOLD", "5"))
+
+# A parenthesised list of bind parameters in any DBAPI paramstyle, e.g. IN (?, ?, ?)
+_PARAM = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+
+def statement_shape(statement: str) -> str:
+    """Statement text with whitespace and bind-parameter lists normalised."""
+    return _PARAM_LIST.sub("(?)", " ".join(statement.split()))
+
+class QueryProfile:
+    def __init__(self):
+        self.queries: List[Tuple[str, float]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_time(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+    def record(self, statement: str, duration: float) -> None:
+        self.queries.append((statement, duration))
+
+    def merge(self, other: "QueryProfile") -> None:
+        self.queries.extend(other.queries)
+
+    def slowest(self, n: int = SQL_PROFILE_SLOWEST) -> List[Tuple[str, float]]:
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:n]
+
+    def repeated(self, threshold: int = SQL_PROFILE_REPEAT_THRESHOLD) -> Dict[str, int]:
+        shapes = Counter(statement_shape(statement) for statement, _ in self.queries)
+        return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+    def statements(self) -> List[str]:
+        return [statement for statement, _ in self.queries]
+
+_profile: ContextVar[Optional[QueryProfile]] = ContextVar("sql_profile", default=None)
+_captures: List[QueryProfile] = []
+
+@contextmanager
+def capture_queries() -> Iterator[QueryProfile]:
+    """Collect the queries run in this context and by any request handled meanwhile.
+
+        with capture_queries() as profile:
+            client.get("/products/")
+        assert profile.count <= 2
+    """
+    profile = QueryProfile()
+    token = _profile.set(profile)
+    _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        _captures.remove(profile)
+        _profile.reset(token)
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        if _profile.get() is not None:
+            conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        profile = _profile.get()
+        starts = conn.info.get("profile_query_start")
+        if profile is not None and starts:
+            profile.record(statement, time.perf_counter() - starts.pop())
+
+def _truncate(statement: str, length: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + "..."
+
+class ProfileMiddleware:
+    """Server-Timing header and a structured log line per request, with N+1 detection.
+
+    A plain ASGI middleware, so when neither SQL_PROFILE nor capture_queries() is on
+    a request pays only for the check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (not SQL_PROFILE and not _captures):
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        status = None
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={profile.total_time * 1000:.1f};desc="{profile.count} queries"')
+                headers.append("Server-Timing", f"app;dur={(time.perf_counter() - start) * 1000:.1f}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _profile.reset(token)
+            _report(scope, status, time.perf_counter() - start, profile)
+            for capture in _captures:
+                capture.merge(profile)
+
+def _report(scope, status: Optional[int], elapsed: float, profile: QueryProfile) -> None:
+    route = scope.get("route")
+    repeated = profile.repeated()
+    record = {
+        "method": scope["method"],
+        "route": route.path if route is not None else scope["path"],
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 2),
+        "queries": profile.count,
+        "db_ms": round(profile.total_time * 1000, 2),
+        "slowest": [{"ms": round(duration * 1000, 2), "sql": _truncate(statement)} for statement, duration in profile.slowest()],
+        "repeated": [{"count": count, "sql": _truncate(shape)} for shape, count in repeated.items()],
+    }
+    if repeated:
+        logger.warning(f"Probable N+1 query pattern: {json.dumps(record)}")
+    else:
+        logger.info(json.dumps(record))
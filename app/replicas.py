@@ -0,0 +1,176 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import Any, Callable, List, Optional, Union
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.datastructures import MutableHeaders
+from sqlalchemy.orm import Session, sessionmaker
+from app.cache import MemoryCache
+from app.database import get_async_engine, get_engine, make_engine, run_db
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated replica URLs; when unset every read goes to the primary
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# A replica that failed is skipped for this long before it is tried again
+DB_REPLICA_RETRY_AFTER = float(os.getenv("DB_REPLICA_RETRY_AFTER", "30"))
+# After a client writes, its reads go to the primary for this long (read-your-writes)
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+
+STICKY_COOKIE = "db_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+class Replica:
+    def __init__(self, url: str, name: str):
+        self.url = url
+        self.name = name
+        self.down_until = 0.0
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self, reason: Any) -> None:
+        if self.healthy:
+            logger.warning(f"Replica {self.name} unavailable, using the primary for {DB_REPLICA_RETRY_AFTER}s: {reason}")
+        self.down_until = time.monotonic() + DB_REPLICA_RETRY_AFTER
+
+    def engine(self, async_mode: bool = False) -> Engine:
+        """Sync engine to bind to; for async sessions, the sync facade of the async engine."""
+        if async_mode not in self._engines:
+            with self._lock:
+                if async_mode not in self._engines:
+                    name = f"{self.name}_async" if async_mode else self.name
+                    engine = make_engine(self.url, name, async_mode=async_mode)
+                    sync_engine = engine.sync_engine if async_mode else engine
+                    event.listen(sync_engine, "handle_error", self._on_error)
+                    self._engines[async_mode] = sync_engine
+        return self._engines[async_mode]
+
+    def _on_error(self, context) -> None:
+        # Connection-level failures take the replica out of rotation; query errors don't
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.original_exception)
+
+class ReplicaSet:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url, f"replica{i}") for i, url in enumerate(urls)]
+        self._next = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        """Next healthy replica in round-robin order, or None to use the primary."""
+        if not self.replicas:
+            return None
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        return None
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS)
+
+class RoutingSession(Session):
+    """Session for read-only endpoints, bound to one replica chosen when it is created."""
+
+    def __init__(self, use_primary: bool = False, async_mode: bool = False, **kw):
+        super().__init__(**kw)
+        self.async_mode = async_mode
+        self.replica = None if use_primary else replicas.choose()
+        self.info["replica"] = self.replica.name if self.replica else None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.replica is not None:
+            return self.replica.engine(self.async_mode)
+        return get_async_engine().sync_engine if self.async_mode else get_engine()
+
+    def use_primary(self) -> None:
+        self.replica = None
+        self.info["replica"] = None
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+ReadAsyncSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession, async_mode=True, autoflush=False, expire_on_commit=False
+)
+
+def fills_cache(db: Session) -> bool:
+    """Only primary reads fill the shared caches: a lagging replica's rows would be served
+    to clients that just wrote, undoing read-your-writes. Replica reads still use cache hits."""
+    return not db.info.get("replica")
+
+async def run_read(db: Union[RoutingSession, AsyncSession], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """run_db for read sessions: if the replica fails during the call, retry once on the primary."""
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    try:
+        return await run_db(db, fn, *args, **kwargs)
+    except Exception:
+        # handle_error has already marked the replica down if the failure was its connection
+        if session.replica is None or session.replica.healthy:
+            raise
+        if isinstance(db, AsyncSession):
+            await db.rollback()
+        else:
+            await run_in_threadpool(db.rollback)
+        session.use_primary()
+        return await run_db(db, fn, *args, **kwargs)
+
+# Per-worker record of recent writers, for API clients that send a token but don't keep cookies
+_recent_writers = MemoryCache(max_entries=10000, ttl=DB_REPLICA_STICKY_SECONDS)
+
+def _client_key(request: Request) -> Optional[str]:
+    # Never the client address: behind a proxy or NAT it is shared by many unrelated clients
+    return request.headers.get("authorization") or None
+
+def reads_from_primary(request: Request) -> bool:
+    if not replicas.replicas:
+        return True
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, "0")) > time.time():
+            return True
+    except ValueError:
+        pass
+    key = _client_key(request)
+    return key is not None and _recent_writers.get(key) is not None
+
+def _sticky_cookie() -> str:
+    cookie = SimpleCookie()
+    cookie[STICKY_COOKIE] = f"{time.time() + DB_REPLICA_STICKY_SECONDS:.3f}"
+    cookie[STICKY_COOKIE]["max-age"] = int(DB_REPLICA_STICKY_SECONDS) + 1
+    cookie[STICKY_COOKIE]["path"] = "/"
+    cookie[STICKY_COOKIE]["httponly"] = True
+    cookie[STICKY_COOKIE]["samesite"] = "lax"
+    return cookie.output(header="").strip()
+
+class TrackWritesMiddleware:
+    """Pin a client's reads to the primary for a short window after it writes.
+
+    Only installed when DATABASE_REPLICA_URLS is set; without replicas every read
+    already goes to the primary.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not replicas.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_tracked(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                key = _client_key(Request(scope))
+                if key is not None:
+                    _recent_writers.set(key, True)
+                MutableHeaders(scope=message).append("set-cookie", _sticky_cookie())
+            await send(message)
+
+        await self.app(scope, receive, send_tracked)
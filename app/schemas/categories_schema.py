@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict
+from app.schemas.image_schema import ImageResponse
 
 class Specification(BaseModel):
     name: str
@@ -16,6 +17,8 @@ class CategoryResponse(BaseModel):
     category_name: str
     image_link: Optional[str] = None
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    product_count: int = 0
     class Config:
         orm_mode = True
 
@@ -54,6 +57,21 @@ class ProductUpdate(BaseModel):
     tags: Optional[str] = None
     in_stock: Optional[bool] = None
 
+class ProductBatchItem(ProductUpdate):
+    id: int
+
+class PriceRule(BaseModel):
+    category_id: Optional[int] = None
+    category: Optional[str] = None
+    price_factor: float = Field(..., gt=0)
+
+class ProductBatchUpdate(BaseModel):
+    products: List[ProductBatchItem] = []
+    rule: Optional[PriceRule] = None
+
+class BatchUpdateReport(BaseModel):
+    updated: int
+
 class ProductResponse(BaseModel):
     id: int
     name: str
@@ -71,5 +89,52 @@ class ProductResponse(BaseModel):
     tags: Optional[str] = None
     in_stock: bool
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    class Config:
+        orm_mode = True
+
+class ProductSummary(BaseModel):
+    id: int
+    name: str
+    price: float
+    old_price: Optional[float] = None
+    category_id: int
+    color: Optional[str] = None
+    rating: Optional[float] = None
+    review_count: Optional[int] = None
+    image_link: Optional[str] = None
+    in_stock: bool
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class CategoryWithProducts(CategoryResponse):
+    products: Optional[List[ProductSummary]] = None
+
+class ProductWithImages(ProductResponse):
+    images: Optional[List[ImageResponse]] = None
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+
+class FacetCount(BaseModel):
+    value: Any
+    count: int
+
+class PriceFacetCount(FacetCount):
+    # max is None for the open-ended top bucket
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: List[FacetCount]
+    colors: List[FacetCount]
+    price: List[PriceFacetCount]
+    rating: List[FacetCount]
+    in_stock: List[FacetCount]
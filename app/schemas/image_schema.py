@@ -6,6 +6,8 @@ class ImageResponse(BaseModel):
     id: int
     image_url: str
     public_id: str
+    thumbnail_url: Optional[str] = None
+    content_hash: Optional[str] = None
     user_id: Optional[int] = None
     product_id: Optional[int] = None
     category_id: Optional[int] = None
@@ -22,3 +22,7 @@ class UserResponse(BaseModel):
 
     class Config:
         orm_mode = True
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
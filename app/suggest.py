@@ -0,0 +1,315 @@
+import itertools
+import logging
+from bisect import bisect_left
+import os
+import threading
+import time
+import unicodedata
+from array import array
+from datetime import datetime
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from app.models.categories_model import Product
+
+logger = logging.getLogger(__name__)
+
+# Build the typeahead index in each worker at startup (opt-in: it holds the catalog in memory per worker)
+SUGGEST_INDEX = os.getenv("SUGGEST_INDEX", "false").lower() in ("1", "true", "yes")
+# Products indexed at most; the build goes best rated first, so the cap drops the least relevant
+SUGGEST_MAX_PRODUCTS = int(os.getenv("SUGGEST_MAX_PRODUCTS", "1000000"))
+# Other workers' writes, bulk imports and batch updates are picked up by polling updated_at
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "5"))
+SUGGEST_BUILD_BATCH = int(os.getenv("SUGGEST_BUILD_BATCH", "10000"))
+# A failed build or refresh is retried after a delay that doubles up to this
+SUGGEST_RETRY_MAX_SECONDS = float(os.getenv("SUGGEST_RETRY_MAX_SECONDS", "300"))
+# Verified candidates looked at before ranking; bounds the work per keystroke
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", "50"))
+# Posting entries examined per query, matching or not; bounds queries whose rarest gram is common
+SUGGEST_CANDIDATE_LIMIT = int(os.getenv("SUGGEST_CANDIDATE_LIMIT", "5000"))
+# Trigram similarity a misspelt query word needs to be corrected to a known word
+SUGGEST_FUZZY_SIMILARITY = float(os.getenv("SUGGEST_FUZZY_SIMILARITY", "0.45"))
+
+_SEPARATOR = "\x1f"
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents, so "Crème" matches "creme"."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def word_trigrams(word: str) -> Iterable[str]:
+    # Two leading spaces give every word a "  a" and " ab" gram, which serve 1-2 char prefixes
+    padded = "  " + word
+    return (padded[i:i + 3] for i in range(len(padded) - 2))
+
+def trigrams(text: str) -> set:
+    grams = set()
+    for word in text.split():
+        grams.update(word_trigrams(word))
+    return grams
+
+def query_trigrams(word: str) -> List[str]:
+    """Trigrams every match of word must contain: a padded prefix gram when it is short."""
+    if len(word) < 3:
+        return [("  " + word)[-3:]]
+    return [word[i:i + 3] for i in range(len(word) - 2)]
+
+class SuggestIndex:
+    """In-memory typeahead over product names and tags.
+
+    Everything per product lives in flat arrays indexed by product id, and each
+    trigram / tag maps to an array('I') of product ids, so a million products cost
+    no per-entry Python objects. Tags are also kept sorted, so a tag prefix is found by
+    bisection however many distinct tags (e.g. SKUs) there are. Names are kept as UTF-8 in one bytearray. Posting
+    lists only grow; a renamed product's old grams stay behind and are filtered out
+    when candidates are verified against the current text.
+
+    Typos are corrected word by word against a vocabulary of the alphabetic words
+    seen in names, which stays small however many products there are.
+    """
+
+    def __init__(self, max_products: int = SUGGEST_MAX_PRODUCTS):
+        self.max_products = max_products
+        self.skipped = 0
+        self.postings: Dict[str, array] = {}
+        self.tag_postings: Dict[str, array] = {}
+        self.tag_names: List[str] = []
+        self._new_tags: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.word_postings: Dict[str, List[str]] = {}
+        self.text = bytearray()
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.prices = array("f")
+        self.ratings = array("f")
+        self.in_stock = bytearray()
+        self.size = 0
+        self.ready = False
+        self.watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def _grow(self, product_id: int) -> None:
+        missing = product_id + 1 - len(self.lengths)
+        if missing > 0:
+            self.offsets.extend([0] * missing)
+            self.lengths.extend([0] * missing)
+            self.prices.extend([0.0] * missing)
+            self.ratings.extend([0.0] * missing)
+            self.in_stock.extend(bytes(missing))
+
+    def _stored(self, product_id: int) -> Optional[str]:
+        if product_id >= len(self.lengths) or not self.lengths[product_id]:
+            return None
+        start = self.offsets[product_id]
+        return self.text[start:start + self.lengths[product_id]].decode()
+
+    def add(self, product_id: int, name: str, tags: Optional[str], price: Optional[float],
+            rating: Optional[float], in_stock: Optional[bool]) -> None:
+        """Insert or update one product; call again with new values on every change."""
+        stored = f"{name or ''}{_SEPARATOR}{tags or ''}"
+        with self._lock:
+            previous = self._stored(product_id)
+            if previous is None and self.size >= self.max_products:
+                self.skipped += 1
+                return
+            self._grow(product_id)
+            if previous != stored:
+                if previous is None:
+                    self.size += 1
+                encoded = stored.encode()
+                self.offsets[product_id] = len(self.text)
+                self.lengths[product_id] = len(encoded)
+                self.text.extend(encoded)
+                normalized = normalize(name or "")
+                for gram in trigrams(normalized):
+                    self.postings.setdefault(gram, array("I")).append(product_id)
+                for word in set(normalized.split()):
+                    self._learn(word)
+                for tag in _split_tags(tags):
+                    if tag not in self.tag_postings:
+                        self.tag_postings[tag] = array("I")
+                        self._new_tags.append(tag)
+                    self.tag_postings[tag].append(product_id)
+            self.prices[product_id] = price or 0.0
+            self.ratings[product_id] = rating or 0.0
+            self.in_stock[product_id] = 1 if in_stock or in_stock is None else 0
+
+    def _learn(self, word: str) -> None:
+        if len(word) < 4 or not word.isalpha():
+            return
+        if word not in self.vocabulary:
+            self.vocabulary[word] = 0
+            for gram in set(word_trigrams(word)):
+                self.word_postings.setdefault(gram, []).append(word)
+        self.vocabulary[word] += 1
+
+    def add_product(self, product) -> None:
+        self.add(product.id, product.name, product.tags, product.price, product.rating, product.in_stock)
+
+    def sort_tags(self) -> List[str]:
+        """Merge tags added since the last call into the sorted tag_names."""
+        with self._lock:
+            if self._new_tags:
+                # A new list rather than in place, so queries walking the old one are unaffected
+                self.tag_names = sorted(self.tag_names + self._new_tags)
+                self._new_tags = []
+            return self.tag_names
+
+    def _candidates(self, words: List[str]) -> Iterable[int]:
+        grams = [gram for word in words for gram in query_trigrams(word)]
+        lists = [self.postings.get(gram) for gram in grams]
+        if all(lists):
+            # Every name match contains every gram: walk the rarest list
+            yield from min(lists, key=len)
+        tag_names = self.sort_tags() if self._new_tags else self.tag_names
+        for i in range(bisect_left(tag_names, words[0]), len(tag_names)):
+            if not tag_names[i].startswith(words[0]):
+                break
+            yield from self.tag_postings[tag_names[i]]
+
+    def _score(self, product_id: int, query: str, words: List[str]) -> Optional[float]:
+        stored = self._stored(product_id)
+        if stored is None:
+            return None
+        name, _, tags = stored.partition(_SEPARATOR)
+        name = normalize(name)
+        for word in words:
+            if word not in name and word not in normalize(tags):
+                return None
+        if name.startswith(query):
+            return 3.0
+        if name.startswith(words[0]) or f" {words[0]}" in name:
+            return 2.0
+        return 1.0 if query in name else 0.5
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        """Top in-stock matches: name prefix, then word prefix, infix, tag; rating breaks ties."""
+        query = " ".join(normalize(query).split())
+        words = query.split()
+        if not words:
+            return []
+
+        found = self._search(query, words, limit)
+        if len(found) < limit and len(query) >= 4:
+            corrected = [self._correct(word) for word in words]
+            if corrected != words:
+                # Corrected matches rank below every exact one
+                for product_id, score in self._search(" ".join(corrected), corrected, limit).items():
+                    found.setdefault(product_id, score / 10)
+
+        ranked = sorted(found, key=lambda product_id: (-found[product_id], -self.ratings[product_id], product_id))
+        return [self._result(product_id) for product_id in ranked[:limit]]
+
+    def _search(self, query: str, words: List[str], limit: int) -> Dict[int, float]:
+        found: Dict[int, float] = {}
+        best = 0
+        for product_id in itertools.islice(self._candidates(words), SUGGEST_CANDIDATE_LIMIT):
+            if product_id in found or not self.in_stock[product_id]:
+                continue
+            score = self._score(product_id, query, words)
+            if score is not None:
+                found[product_id] = score
+                best += score == 3.0
+                # Postings are filled best rated first, so the first full page of name-prefix hits wins
+                if best >= limit or len(found) >= SUGGEST_SCAN_LIMIT:
+                    break
+        return found
+
+    def _correct(self, word: str) -> str:
+        """The known word most similar to word, or word itself if it is already a known prefix or infix."""
+        if len(word) < 4 or not word.isalpha():
+            return word
+        grams = set(word_trigrams(word))
+        lists = [self.word_postings.get(gram) for gram in grams]
+        if all(lists) and any(word in known for known in min(lists, key=len)):
+            return word
+        shared = Counter()
+        for known in lists:
+            shared.update(known or ())
+        best, best_key = word, (SUGGEST_FUZZY_SIMILARITY, 0)
+        for known, count in shared.items():
+            key = (count / (len(grams) + len(known) - count), self.vocabulary[known])
+            if key >= best_key:
+                best, best_key = known, key
+        return best
+
+    def _result(self, product_id: int) -> dict:
+        name = self._stored(product_id).partition(_SEPARATOR)[0]
+        return {"id": product_id, "name": name, "price": round(self.prices[product_id], 2)}
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "products": self.size,
+            "max_products": self.max_products,
+            "skipped": self.skipped,
+            "trigrams": len(self.postings),
+            "tags": len(self.tag_postings),
+            "postings": sum(len(ids) for ids in self.postings.values()),
+            "text_bytes": len(self.text),
+            "vocabulary": len(self.vocabulary),
+        }
+
+def _split_tags(tags: Optional[str]) -> List[str]:
+    return [normalize(tag.strip()) for tag in (tags or "").split(",") if tag.strip()]
+
+_COLUMNS = (Product.id, Product.name, Product.tags, Product.price, Product.rating, Product.in_stock, Product.updated_at)
+
+def _load(index: SuggestIndex, rows: Iterable) -> None:
+    for row in rows:
+        index.add(row.id, row.name, row.tags, row.price, row.rating, row.in_stock)
+        if row.updated_at is not None and (index.watermark is None or row.updated_at > index.watermark):
+            index.watermark = row.updated_at
+
+def build(index: SuggestIndex, engine: Engine) -> None:
+    """Stream every product into the index, best rated first so postings favour them."""
+    start = time.perf_counter()
+    stmt = select(*_COLUMNS).order_by(Product.rating.desc().nulls_last(), Product.id)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=SUGGEST_BUILD_BATCH).execute(stmt)
+        for rows in result.partitions():
+            _load(index, rows)
+    # Sort here rather than on the first query
+    index.sort_tags()
+    index.ready = True
+    logger.info(f"Suggest index built: {index.size} products in {time.perf_counter() - start:.1f}s")
+    if index.skipped:
+        logger.warning(f"Suggest index is full: {index.skipped} products beyond SUGGEST_MAX_PRODUCTS were left out")
+
+def refresh(index: SuggestIndex, engine: Engine) -> None:
+    """Apply products changed since the last build or refresh."""
+    stmt = select(*_COLUMNS).order_by(Product.updated_at)
+    if index.watermark is not None:
+        # >= re-reads rows sharing the newest timestamp; re-adding them is a no-op
+        stmt = stmt.where(Product.updated_at >= index.watermark)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=SUGGEST_BUILD_BATCH).execute(stmt)
+        for rows in result.partitions():
+            _load(index, rows)
+    index.sort_tags()
+
+def maintain(index: SuggestIndex, engine: Engine, stop: threading.Event) -> None:
+    """Build, then refresh every SUGGEST_REFRESH_SECONDS; failures back off and retry."""
+    delay, retry = 0.0, SUGGEST_REFRESH_SECONDS
+    while not stop.wait(delay):
+        step = refresh if index.ready else build
+        try:
+            step(index, engine)
+        except Exception as e:
+            logger.error(f"Failed to {step.__name__} suggest index, retrying in {retry:.0f}s: {str(e)}")
+            delay, retry = retry, min(retry * 2, SUGGEST_RETRY_MAX_SECONDS)
+        else:
+            delay, retry = SUGGEST_REFRESH_SECONDS, SUGGEST_REFRESH_SECONDS
+
+suggest_index = SuggestIndex()
+_stop = threading.Event()
+
+def start(engine: Engine) -> None:
+    """Build the index in a background thread, then keep it in sync by polling."""
+    threading.Thread(target=maintain, args=(suggest_index, engine, _stop), name="suggest-index", daemon=True).start()
+
+def stop() -> None:
+    _stop.set()
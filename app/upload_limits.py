@@ -0,0 +1,183 @@
+import logging
+import os
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+from multipart.multipart import parse_options_header
+from starlette.datastructures import FormData, UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "20"))
+# Upload requests handled at once per worker; the rest get 503 so catalog reads keep their capacity
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "8"))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "5"))
+
+class UploadTooLarge(MultiPartException):
+    """Raised from the body stream, so the parser closes the files it has spooled so far."""
+
+class PartLimiter:
+    """Measures each part of a multipart body as it streams in, using only the boundary.
+
+    Works on the raw bytes ahead of the form parser, so it needs nothing from the
+    parser's internals. Only file parts (those with a filename) are limited.
+    """
+
+    HEADER_BYTES_KEPT = 1024
+
+    def __init__(self, boundary: bytes, max_file_bytes: int):
+        self.delimiter = b"\r\n--" + boundary
+        self.max_file_bytes = max_file_bytes
+        # The body opens with "--boundary": a leading CRLF makes every delimiter look alike
+        self.pending = b"\r\n"
+        self.in_headers = False
+        self.headers = b""
+        self.filename: Optional[str] = None
+        self.size = 0
+
+    def feed(self, chunk: bytes) -> None:
+        data, pos = self.pending + chunk, 0
+        while True:
+            if self.in_headers:
+                end = data.find(b"\r\n\r\n", pos)
+                if end == -1:
+                    keep = max(pos, len(data) - 3)
+                    self.headers = (self.headers + data[pos:keep])[:self.HEADER_BYTES_KEPT]
+                    self.pending = data[keep:]
+                    return
+                self.headers = (self.headers + data[pos:end])[:self.HEADER_BYTES_KEPT]
+                self.filename = self._filename()
+                self.in_headers, self.size, pos = False, 0, end + 4
+            else:
+                start = data.find(self.delimiter, pos)
+                if start == -1:
+                    keep = max(pos, len(data) - len(self.delimiter) + 1)
+                    self._count(keep - pos)
+                    self.pending = data[keep:]
+                    return
+                self._count(start - pos)
+                self.in_headers, self.headers, pos = True, b"", start + len(self.delimiter)
+
+    def _count(self, size: int) -> None:
+        self.size += size
+        if self.filename is not None and self.size > self.max_file_bytes:
+            raise UploadTooLarge(f"File {self.filename} exceeds {self.max_file_bytes} bytes")
+
+    def _filename(self) -> Optional[str]:
+        for line in self.headers.split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-disposition":
+                filename = parse_options_header(value.strip())[1].get(b"filename")
+                return filename.decode("latin-1") if filename is not None else None
+        return None
+
+async def _limited(stream: AsyncIterator[bytes], max_bytes: int, parts: PartLimiter) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(f"Request body exceeds {max_bytes} bytes")
+        parts.feed(chunk)
+        yield chunk
+
+async def read_upload_form(request: Request) -> FormData:
+    """Parse a multipart body under the per-file, per-request and file-count limits."""
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+    boundary = parse_options_header(content_type)[1].get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing boundary in multipart.")
+    parser = MultiPartParser(
+        request.headers,
+        _limited(request.stream(), UPLOAD_MAX_REQUEST_BYTES, PartLimiter(boundary, UPLOAD_MAX_FILE_BYTES)),
+        max_files=UPLOAD_MAX_FILES,
+        max_fields=UPLOAD_MAX_FILES,
+    )
+    try:
+        return await parser.parse()
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+def form_files(field: str, required: bool = True):
+    """Dependency returning the uploaded files of one form field, closed after the response."""
+
+    async def dependency(request: Request) -> AsyncIterator[List[UploadFile]]:
+        form = await read_upload_form(request)
+        try:
+            files = [item for item in form.getlist(field) if isinstance(item, StarletteUploadFile)]
+            if required and not files:
+                raise HTTPException(status_code=422, detail=f"Missing file field '{field}'")
+            yield files
+        finally:
+            await form.close()
+
+    return dependency
+
+def multipart_schema(field: str, multiple: bool) -> dict:
+    # Form parsing happens in a dependency, so document the body for OpenAPI by hand
+    file_schema = {"type": "string", "format": "binary"}
+    schema = {"type": "array", "items": file_schema} if multiple else file_schema
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": {field: schema}, "required": [field]}
+                }
+            },
+        }
+    }
+
+class UploadAdmissionMiddleware:
+    """Admission control for upload routes, applied before any of the body is read.
+
+    Rejects a declared Content-Length over the request cap with 413, and answers 503
+    with Retry-After once max_concurrent uploads are already in flight.
+    """
+
+    def __init__(self, app, path_prefix: str, max_concurrent: int = UPLOAD_MAX_CONCURRENT,
+                 max_request_bytes: int = UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_concurrent = max_concurrent
+        self.max_request_bytes = max_request_bytes
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_request_bytes:
+            response = JSONResponse(
+                {"detail": f"Request body exceeds {self.max_request_bytes} bytes"},
+                status_code=413,
+                headers={"Connection": "close"},
+            )
+            await response(scope, receive, send)
+            return
+
+        # Single event loop per worker: a plain counter is enough
+        if self.in_flight >= self.max_concurrent:
+            logger.warning(f"Rejecting upload: {self.in_flight} uploads already in flight")
+            response = JSONResponse(
+                {"detail": "Too many uploads in progress, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(UPLOAD_RETRY_AFTER), "Connection": "close"},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,78 @@
+import logging
+import os
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Optional
+import cloudinary.uploader
+
+logger = logging.getLogger(__name__)
+
+# "cloudinary" (default) or "local:<directory>[,<base url>]" to store files on disk
+IMAGE_STORAGE = os.getenv("IMAGE_STORAGE", "cloudinary")
+# Files above this are sent in chunks of this size (Cloudinary's minimum chunk is 5 MB)
+CLOUDINARY_CHUNK_SIZE = int(os.getenv("CLOUDINARY_CHUNK_SIZE", str(6 * 1024 * 1024)))
+
+class Uploader(ABC):
+    """Remote image store. Implementations are blocking; callers run them in a threadpool."""
+
+    @abstractmethod
+    def upload(self, file: BinaryIO, public_id: str) -> str:
+        """Store the file under public_id and return its public URL."""
+
+    @abstractmethod
+    def destroy(self, public_id: str) -> None:
+        ...
+
+class CloudinaryUploader(Uploader):
+    def upload(self, file: BinaryIO, public_id: str) -> str:
+        options = dict(public_id=public_id, unique_filename=False, overwrite=True)
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        if size > CLOUDINARY_CHUNK_SIZE:
+            result = cloudinary.uploader.upload_large(file, chunk_size=CLOUDINARY_CHUNK_SIZE, **options)
+        else:
+            result = cloudinary.uploader.upload(file, **options)
+        image_url = result.get("secure_url")
+        if not image_url:
+            raise RuntimeError(f"Cloudinary returned no URL for {public_id}")
+        return image_url
+
+    def destroy(self, public_id: str) -> None:
+        cloudinary.uploader.destroy(public_id)
+
+class LocalUploader(Uploader):
+    """Filesystem stand-in for the remote store, for local runs and tests."""
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = Path(root)
+        self.base_url = (base_url or self.root.resolve().as_uri()).rstrip("/")
+
+    def _path(self, public_id: str) -> Path:
+        path = (self.root / public_id).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid public_id {public_id!r}")
+        return path
+
+    def upload(self, file: BinaryIO, public_id: str) -> str:
+        path = self._path(public_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(file, out)
+        return f"{self.base_url}/{public_id}"
+
+    def destroy(self, public_id: str) -> None:
+        self._path(public_id).unlink(missing_ok=True)
+
+def create_uploader(storage: str = IMAGE_STORAGE) -> Uploader:
+    if storage.startswith("local:"):
+        root, _, base_url = storage[len("local:"):].partition(",")
+        logger.info(f"Storing images on the local filesystem under {root}")
+        return LocalUploader(root, base_url or None)
+    return CloudinaryUploader()
+
+uploader: Uploader = create_uploader()
+
+def set_uploader(new_uploader: Uploader) -> None:
+    global uploader
+    uploader = new_uploader
@@ -1,15 +1,40 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 
-from app.models.users_model import User 
-from app.schemas.users_schema import UserCreate  
+from app.models.users_model import User
+from app.schemas.users_schema import UserCreate
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small dedicated pool caps how many cores hashing can take
+# without borrowing threads from the request threadpool that serves catalog reads
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def create_user(db: Session, user: UserCreate) -> User:
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.hash, password)
+
+async def verify_password(password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Return (valid, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    loop = asyncio.get_running_loop()
+    if hashed_password is None:
+        # Burn the same time as a real check so unknown emails can't be told apart
+        await loop.run_in_executor(_hash_executor, pwd_context.dummy_verify)
+        return False, None
+    return await loop.run_in_executor(_hash_executor, pwd_context.verify_and_update, password, hashed_password)
+
+def create_user(db: Session, user: UserCreate, hashed_password: Optional[str] = None) -> User:
     db_user = User(
         first_name=user.first_name,
         last_name=user.last_name,
@@ -18,9 +43,21 @@ def create_user(db: Session, user: UserCreate) -> User:
         is_active=user.is_active,
         is_admin=user.is_admin,
         created_at=user.created_at,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=hashed_password or get_password_hash(user.password),
     )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
+
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+
+def get_user(db: Session, user_id: int) -> Optional[User]:
+    return db.get(User, user_id)
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    db_user = db.get(User, user_id)
+    if db_user:
+        db_user.hashed_password = hashed_password
+        db.commit()
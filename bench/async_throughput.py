@@ -0,0 +1,78 @@
+"""Throughput of the sync (threadpool) and async (DB_ASYNC=1) session paths.
+
+Starts one uvicorn worker per mode against the same database and drives
+GET /products/ and GET /products/{id} at a fixed concurrency.
+
+    python -m bench.async_throughput --database-url sqlite:////tmp/bench.db --products 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import httpx
+
+def start_server(database_url: str, port: int, async_mode: bool) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ASYNC="1" if async_mode else "0")
+    env.setdefault("SECRET_KEY", "bench")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/cache/stats", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def seed(base_url: str, products: int) -> None:
+    if httpx.get(f"{base_url}/products/?limit=1").json():
+        return
+    lines = "\n".join(
+        f'{{"name": "Product {i}", "price": {random.uniform(1, 500):.2f}, "category": "Category {i % 20}"}}'
+        for i in range(products)
+    )
+    files = {"file": ("seed.ndjson", lines.encode(), "application/x-ndjson")}
+    httpx.post(f"{base_url}/products/import", files=files, timeout=600).raise_for_status()
+
+async def drive(base_url: str, products: int, requests: int, concurrency: int) -> float:
+    paths = ["/products/?limit=50"] + [f"/products/{random.randint(1, products)}" for _ in range(99)]
+    queue = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        for _ in queue:
+            (await client.get(random.choice(paths))).raise_for_status()
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", default="sqlite:////tmp/bench.db")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for async_mode in (False, True):
+        proc = start_server(args.database_url, args.port, async_mode)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            seed(base_url, args.products)
+            rps = asyncio.run(drive(base_url, args.products, args.requests, args.concurrency))
+            print(f"{'async' if async_mode else 'sync '}: {rps:8.1f} req/s at concurrency {args.concurrency}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
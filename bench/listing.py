@@ -0,0 +1,70 @@
+"""Latency and CPU per 100-item page: full ProductResponse vs fields=summary.
+
+Runs the app in-process against a seeded SQLite file (or DATABASE_URL).
+
+    python -m bench.listing --products 5000 --pages 300
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+def seed_lines(count: int):
+    for i in range(count):
+        yield json.dumps({
+            "name": f"Product {i}",
+            "price": round(random.uniform(1, 500), 2),
+            "category": f"Category {i % 25}",
+            "colors": random.sample(["red", "blue", "green", "black", "white"], 2),
+            "rating": round(random.uniform(1, 5), 1),
+            "description": "Lorem ipsum dolor sit amet. " * 40,
+            "features": [f"Feature {n}" for n in range(8)],
+            "specifications": [{"name": f"Spec {n}", "value": f"Value {n}"} for n in range(12)],
+            "tags": "school,office,stationery",
+        }) + "\n"
+
+def measure(client, url: str, pages: int, page_size: int, total: int):
+    latencies, cpu = [], []
+    for _ in range(pages):
+        skip = random.randint(0, max(total - page_size, 0))
+        wall, proc = time.perf_counter(), time.process_time()
+        client.get(f"{url}{'&' if '?' in url else '?'}limit={page_size}&skip={skip}").raise_for_status()
+        latencies.append(time.perf_counter() - wall)
+        cpu.append(time.process_time() - proc)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "cpu_ms": statistics.mean(cpu) * 1000,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", default="sqlite:////tmp/bench_listing.db")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SECRET_KEY", "bench")
+    from fastapi.testclient import TestClient
+    from app.database import get_engine
+    from app.main import app
+    from app.migrate import migrate
+
+    migrate(get_engine())
+    client = TestClient(app)
+    if not client.get("/products/?limit=1").json():
+        payload = "".join(seed_lines(args.products)).encode()
+        client.post("/products/import", files={"file": ("seed.ndjson", payload)}).raise_for_status()
+
+    for label, url in (("full", "/products/"), ("fields=summary", "/products/?fields=summary")):
+        measure(client, url, 10, args.page_size, args.products)  # warm up
+        result = measure(client, url, args.pages, args.page_size, args.products)
+        print(f"{label:15s} p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms  cpu {result['cpu_ms']:6.2f} ms/page")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Typeahead index: build time, memory and per-query latency on a synthetic catalog.
+
+Fills the index in-process (no database) and times typical keystroke queries.
+--sku-tags also gives every product a tag of its own, as a SKU would.
+
+    python -m bench.suggest --products 1000000
+    python -m bench.suggest --products 1000000 --sku-tags
+"""
+import argparse
+import random
+import statistics
+import time
+import resource
+from app.suggest import SuggestIndex
+
+ADJECTIVES = ["blue", "red", "green", "black", "mini", "large", "eco", "premium", "soft", "metal", "glitter", "neon"]
+NOUNS = ["pen", "pencil", "notebook", "eraser", "marker", "ruler", "stapler", "folder", "crayon", "sharpener",
+         "backpack", "calculator", "highlighter", "binder", "scissors", "glue", "paint", "brush", "compass"]
+BRANDS = ["Bic", "Faber", "Staedtler", "Pilot", "Stabilo", "Crayola", "Oxford", "Moleskine", "Casio", "Pentel"]
+TAGS = ["school", "office", "art", "kids", "eco", "premium", "sale", "back-to-school", "stationery"]
+QUERIES = ["p", "pe", "pen", "penc", "note", "blue n", "stab", "calc", "highl", "eras", "crayo", "shar",
+           "scisors", "notbook", "glitter pen", "mol", "kids", "zzzz", "sku-0000123"]
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--sku-tags", action="store_true", help="one distinct tag per product")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    index = SuggestIndex()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    for product_id in range(1, args.products + 1):
+        name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.randint(1, 999)}"
+        tags = rng.sample(TAGS, 2) + ([f"sku-{product_id:08d}"] if args.sku_tags else [])
+        index.add(product_id, name, ",".join(tags), rng.uniform(1, 50),
+                  round(rng.uniform(1, 5), 1), rng.random() < 0.9)
+    index.sort_tags()
+    build = time.perf_counter() - start
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) * 1024
+    index.ready = True
+    print(f"built {args.products} products in {build:.1f}s, {memory / 2 ** 20:.0f} MiB peak RSS growth, {index.stats()}")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            results = index.suggest(query, args.limit)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{query!r:15} p50 {statistics.median(timings) * 1e6:7.0f} us  "
+              f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:7.0f} us  "
+              f"top: {results[0]['name'] if results else '-'}")
+
+if __name__ == "__main__":
+    main()
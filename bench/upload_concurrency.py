@@ -0,0 +1,53 @@
+"""Compare sequential vs concurrent image uploads against a fake uploader.
+
+    python -m bench.upload_concurrency --files 8 --latency 0.2 --concurrency 8
+"""
+import argparse
+import asyncio
+import io
+import random
+import time
+from app import image
+from app.uploader import Uploader, set_uploader
+
+class FakeUploader(Uploader):
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+
+    def upload(self, file, public_id):
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        return f"https://fake.local/{public_id}"
+
+    def destroy(self, public_id):
+        pass
+
+async def sequential(fake, uploads):
+    for file, public_id in uploads:
+        fake.upload(file, public_id)
+
+async def run(files: int, latency: float, jitter: float, concurrency: int) -> None:
+    fake = FakeUploader(latency, jitter)
+    set_uploader(fake)
+    uploads = [(io.BytesIO(b"x"), f"bench/{i}") for i in range(files)]
+
+    start = time.perf_counter()
+    await sequential(fake, uploads)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await image.upload_files(uploads, concurrency=concurrency)
+    concurrent_time = time.perf_counter() - start
+
+    print(f"files={files} latency={latency}s jitter={jitter}s concurrency={concurrency}")
+    print(f"sequential: {sequential_time:.3f}s")
+    print(f"concurrent: {concurrent_time:.3f}s ({sequential_time / concurrent_time:.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args.files, args.latency, args.jitter, args.concurrency))
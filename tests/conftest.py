@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+# Configure before app modules read their settings at import time. TEST_DATABASE_URL runs
+# the suite against a scratch Postgres database instead (its tables are emptied)
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["DB_MIGRATE_ON_STARTUP"] = "false"
+os.environ["SUGGEST_INDEX"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app import cache, database
+from app.categories import category_ids
+from app.database import Base, SessionLocal, get_engine
+from app.main import app
+from app.migrate import migrate
+
+@pytest.fixture(scope="session")
+def engine():
+    engine = get_engine()
+    migrate(engine)
+    return engine
+
+@pytest.fixture(autouse=True)
+def clean_database(engine):
+    yield
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    cache.cache.clear()
+    category_ids.clear()
+
+@pytest.fixture
+def client(engine):
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def db(engine):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def make_product(client):
+    def make(name="Pencil", price=1.5, category="Stationery", **fields):
+        response = client.post("/products/", json={"name": name, "price": price, "category": category, **fields})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
+
+@pytest.fixture(params=["on conflict", "fallback"])
+def insert_path(request, monkeypatch):
+    """Run a test with INSERT ... ON CONFLICT and again as on a dialect without it."""
+    if request.param == "fallback":
+        monkeypatch.setattr(database, "UPSERT_INSERTS", {})
+    return request.param
+
+@pytest.fixture
+def explain(client, engine):
+    """Query plans of the SELECTs from one request, e.g. explain("/products/search?category_id=1")."""
+    def run(url: str, table: str = "products", match: str = "ORDER BY") -> str:
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().startswith("SELECT") and f"FROM {table}" in statement and match in statement:
+                statements.append((statement, parameters))
+
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            assert client.get(url).status_code == 200
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        plans = []
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                # Test tables are tiny; make the planner show which indexes it can use
+                conn.exec_driver_sql("SET enable_seqscan = off")
+                prefix = "EXPLAIN "
+            else:
+                prefix = "EXPLAIN QUERY PLAN "
+            for statement, parameters in statements:
+                rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+                plans.append("\n".join(" ".join(str(value) for value in row) for row in rows))
+        return "\n\n".join(plans)
+    return run
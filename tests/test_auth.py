@@ -0,0 +1,91 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import update
+from app import cache, users
+from app.auth import create_access_token
+from app.models.users_model import User
+from app.profiling import capture_queries
+
+PASSWORD = "correct horse"
+
+@pytest.fixture(autouse=True)
+def fast_hashes(monkeypatch):
+    monkeypatch.setattr(users, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4))
+
+@pytest.fixture
+def user(client):
+    response = client.post("/users/", json={
+        "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "password": PASSWORD,
+        "phone": "0700000000", "created_at": "2024-01-01T00:00:00",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def log_in(client, email="ada@example.com", password=PASSWORD):
+    return client.post("/auth/token", data={"username": email, "password": password})
+
+def me(client, token):
+    return client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+def test_login_issues_a_token_for_users_me(client, user):
+    response = log_in(client)
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+    current = me(client, response.json()["access_token"])
+    assert current.status_code == 200
+    assert current.json()["email"] == "ada@example.com"
+
+@pytest.mark.parametrize("email, password", [("ada@example.com", "wrong"), ("nobody@example.com", PASSWORD)])
+def test_bad_credentials_are_rejected(client, user, email, password):
+    response = log_in(client, email, password)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+def test_tampered_and_expired_tokens_are_rejected(client, user):
+    payload, signature = create_access_token(user["id"]).split(".")
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    forged = base64.urlsafe_b64encode(json.dumps(dict(claims, sub=user["id"] + 1)).encode()).decode().rstrip("=")
+
+    assert me(client, f"{forged}.{signature}").status_code == 401
+    assert me(client, f"{payload}.{signature[:-2]}xx").status_code == 401
+    assert me(client, "not-a-token").status_code == 401
+    assert me(client, create_access_token(user["id"], ttl=-1)).status_code == 401
+    assert client.get("/users/me").status_code == 401
+
+def test_hash_is_upgraded_when_the_cost_changes(client, user, db, monkeypatch):
+    old_hash = db.get(User, user["id"]).hashed_password
+    assert old_hash.startswith("$2b$04$")
+    monkeypatch.setattr(users, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5))
+
+    assert log_in(client).status_code == 200
+    db.expire_all()
+    new_hash = db.get(User, user["id"]).hashed_password
+    assert new_hash.startswith("$2b$05$")
+    assert log_in(client).status_code == 200
+
+def test_token_user_is_cached_until_invalidated(client, user, db):
+    token = log_in(client).json()["access_token"]
+    assert me(client, token).status_code == 200
+    with capture_queries() as profile:
+        assert me(client, token).status_code == 200
+    assert profile.count == 0
+
+    # A deactivated user keeps access for at most TOKEN_CACHE_TTL
+    db.execute(update(User).where(User.id == user["id"]).values(is_active=False))
+    db.commit()
+    assert me(client, token).status_code == 200
+    cache.cache.clear()
+    assert me(client, token).status_code == 401
+
+def test_missing_secret_key_stops_startup_unless_allowed():
+    env = {name: value for name, value in os.environ.items() if name != "SECRET_KEY"}
+    refused = subprocess.run([sys.executable, "-c", "import app.auth"], env=env, capture_output=True, text=True)
+    assert refused.returncode != 0
+    assert "SECRET_KEY is not set" in refused.stderr
+    allowed = subprocess.run([sys.executable, "-c", "import app.auth"], env=dict(env, ALLOW_RANDOM_SECRET_KEY="1"))
+    assert allowed.returncode == 0
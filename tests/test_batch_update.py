@@ -0,0 +1,61 @@
+import pytest
+
+@pytest.fixture
+def catalog(make_product):
+    pens = [make_product(name=f"Pen {i}", price=10.0, category="Pens") for i in range(3)]
+    ruler = make_product(name="Ruler", price=4.0, category="Math")
+    return pens, ruler
+
+def products(client):
+    return {product["name"]: product for product in client.get("/products/").json()}
+
+def test_updates_many_products_in_one_request(client, catalog):
+    pens, ruler = catalog
+    response = client.patch("/products/batch", json={"products": [
+        {"id": pens[0]["id"], "price": 8.0},
+        {"id": ruler["id"], "category": "Pens", "in_stock": False},
+    ]})
+    assert response.json() == {"updated": 2}
+
+    after = products(client)
+    assert (after["Pen 0"]["price"], after["Pen 0"]["old_price"]) == (8.0, 10.0)
+    assert after["Ruler"]["category_id"] == pens[0]["category_id"]
+    counts = {category["category_name"]: category["product_count"] for category in client.get("/categories/").json()}
+    assert counts == {"Pens": 4, "Math": 0}
+
+def test_rule_and_explicit_items_update_each_product_once(client, catalog):
+    pens, ruler = catalog
+    response = client.patch("/products/batch", json={
+        "products": [
+            {"id": pens[0]["id"], "price": 7.0},
+            {"id": pens[1]["id"], "name": "Pen renamed"},
+            {"id": ruler["id"], "price": 5.0},
+        ],
+        "rule": {"category": "Pens", "price_factor": 0.9},
+    })
+    assert response.json() == {"updated": 4}
+
+    after = products(client)
+    # An explicit price wins over the rule; old_price is the price before the batch
+    assert (after["Pen 0"]["price"], after["Pen 0"]["old_price"]) == (7.0, 10.0)
+    assert (after["Pen renamed"]["price"], after["Pen renamed"]["old_price"]) == (9.0, 10.0)
+    assert (after["Pen 2"]["price"], after["Pen 2"]["old_price"]) == (9.0, 10.0)
+    assert (after["Ruler"]["price"], after["Ruler"]["old_price"]) == (5.0, 4.0)
+
+def test_rule_reprices_facet_buckets(client, catalog):
+    pens, _ = catalog
+    client.patch("/products/batch", json={"rule": {"category_id": pens[0]["category_id"], "price_factor": 0.4}})
+    facets = client.get(f"/products/facets?category_id={pens[0]['category_id']}").json()
+    assert facets["total"] == 3
+    assert [(bucket["max"], bucket["count"]) for bucket in facets["price"]] == [(5.0, 3)]
+
+def test_batch_is_all_or_nothing(client, catalog):
+    pens, _ = catalog
+    response = client.patch("/products/batch", json={"products": [
+        {"id": pens[0]["id"], "price": 1.0},
+        {"id": 9999, "price": 1.0},
+    ]})
+    assert response.status_code == 404
+    assert products(client)["Pen 0"]["price"] == 10.0
+    duplicate = client.patch("/products/batch", json={"products": [{"id": pens[0]["id"]}, {"id": pens[0]["id"]}]})
+    assert duplicate.status_code == 400
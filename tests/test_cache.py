@@ -0,0 +1,59 @@
+import pytest
+from app import cache
+from app.cache import CacheBackend, MemoryCache, cached, invalidate, set_backend
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = MemoryCache(max_entries=2, ttl=60)
+    monkeypatch.setattr(cache, "cache", backend)
+    return backend
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+def test_memory_cache_evicts_least_recently_used(backend):
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.stats()["evictions"] == 1
+
+def test_cached_loads_once_until_invalidated(backend):
+    loads = []
+    load = lambda: loads.append(1) or len(loads)
+    assert cached("products", "1", load) == 1
+    assert cached("products", "1", load) == 1
+    invalidate("products")
+    assert cached("products", "1", load) == 2
+
+def test_value_loaded_across_an_invalidation_is_not_stored(backend):
+    def load():
+        # A write lands while this read is still loading the old row
+        invalidate("products")
+        return "old"
+
+    assert cached("products", "1", load) == "old"
+    assert cached("products", "1", lambda: "new") == "new"
+
+def test_update_invalidates_cached_listings(client, make_product):
+    product = make_product(name="Old name")
+    assert client.get("/products/").json()[0]["name"] == "Old name"
+    assert client.get(f"/categories/{product['category_id']}").json()["product_count"] == 1
+
+    client.put(f"/products/{product['id']}", json={"name": "New name"})
+    make_product(name="Second")
+    assert [p["name"] for p in client.get("/products/").json()] == ["New name", "Second"]
+    assert client.get(f"/categories/{product['category_id']}").json()["product_count"] == 2
+
+def test_stats_follow_the_configured_backend(client, monkeypatch):
+    monkeypatch.setattr(cache, "cache", cache.cache)
+    backend = MemoryCache(max_entries=7)
+    set_backend(backend)
+    backend.get("missing")
+    stats = client.get("/cache/stats").json()
+    assert stats["max_entries"] == 7
+    assert stats["misses"] == 1
+    assert "cache_misses_total 1" in client.get("/metrics").text
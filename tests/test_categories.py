@@ -0,0 +1,72 @@
+from sqlalchemy import func, select
+from app.categories import _insert_categories, upsert_categories
+from app.models.categories_model import Category
+from app.profiling import capture_queries
+
+def test_upsert_creates_missing_names_once(db, insert_path):
+    first = upsert_categories(db, ["Art", "Books"])
+    db.commit()
+    second = upsert_categories(db, ["Books", "Math", "Art"])
+    db.commit()
+    assert second["Art"] == first["Art"] and second["Books"] == first["Books"]
+    assert db.execute(select(func.count(Category.id))).scalar() == 3
+
+def test_insert_skips_names_another_transaction_created(db, insert_path):
+    db.add(Category(category_name="Art"))
+    db.commit()
+    inserted = _insert_categories(db, [{"category_name": "Art"}, {"category_name": "Math"}])
+    db.commit()
+    assert list(inserted) == ["Math"]
+    assert sorted(db.execute(select(Category.category_name)).scalars()) == ["Art", "Math"]
+
+def test_products_create_their_category_by_name(client, make_product, insert_path):
+    first = make_product(category="Stationery")
+    second = make_product(category="Stationery")
+    assert first["category_id"] == second["category_id"]
+    assert client.get(f"/categories/{first['category_id']}").json()["product_count"] == 2
+
+def counts(client):
+    return {category["category_name"]: category["product_count"] for category in client.get("/categories/").json()}
+
+def test_embedded_products_are_loaded_in_a_fixed_number_of_queries(client, make_product):
+    def listing():
+        with capture_queries() as profile:
+            response = client.get("/categories/?include=products&per_category=2")
+        assert response.status_code == 200
+        return response.json(), profile.count
+
+    for i in range(3):
+        make_product(name=f"Art {i}", category="Art")
+    make_product(name="Book 0", category="Books")
+    few, few_queries = listing()
+    assert [[product["name"] for product in category["products"]] for category in few] == [["Art 0", "Art 1"], ["Book 0"]]
+    assert [category["product_count"] for category in few] == [3, 1]
+
+    for i in range(5):
+        make_product(name=f"Extra {i}", category=f"Category {i}")
+    many, many_queries = listing()
+    assert len(many) == 7
+    assert many_queries == few_queries
+
+def test_product_count_follows_category_moves(client, make_product):
+    pen = make_product(name="Pen", category="Art")
+    book = make_product(name="Book", category="Books")
+    make_product(name="Ruler", category="Books")
+
+    client.put(f"/products/{pen['id']}", json={"category": "Books"})
+    assert counts(client) == {"Art": 0, "Books": 3}
+
+    # Several products moving in one batch
+    response = client.patch("/products/batch", json={"products": [
+        {"id": pen["id"], "category_id": pen["category_id"]},
+        {"id": book["id"], "category_id": pen["category_id"]},
+    ]})
+    assert response.status_code == 200
+    assert counts(client) == {"Art": 2, "Books": 1}
+
+def test_product_count_includes_imported_products(client, make_product):
+    make_product(name="Pen", category="Art")
+    content = b'{"name": "Brush", "price": 2, "category": "Art"}\n{"name": "Atlas", "price": 9, "category": "Books"}\n'
+    response = client.post("/products/import", files={"file": ("products.ndjson", content)})
+    assert response.json()["imported"] == 2
+    assert counts(client) == {"Art": 2, "Books": 1}
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.models.categories_model import Category, Product
+
+def test_get_product_sends_validators_and_304(client, make_product):
+    product = make_product()
+    first = client.get(f"/products/{product['id']}")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "public, no-cache"
+
+    again = client.get(f"/products/{product['id']}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+def test_if_modified_since_never_hides_a_write_in_the_same_second(client, make_product, db):
+    product = make_product()
+    url = f"/products/{product['id']}"
+    # Written this second: no Last-Modified yet, so no If-Modified-Since can match it
+    assert "Last-Modified" not in client.get(url).headers
+    client.put(url, json={"price": 9.99})
+    response = client.get(url, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
+    assert response.json()["price"] == 9.99
+
+    past = datetime.utcnow() - timedelta(minutes=5)
+    db.execute(update(Product).where(Product.id == product["id"]).values(created_at=past, updated_at=past))
+    db.commit()
+    last_modified = client.get(url).headers["Last-Modified"]
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+def test_update_through_api_changes_etag(client, make_product):
+    product = make_product()
+    etag = client.get(f"/products/{product['id']}").headers["ETag"]
+    client.put(f"/products/{product['id']}", json={"price": 9.99})
+
+    response = client.get(f"/products/{product['id']}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["price"] == 9.99
+
+def test_write_from_another_session_is_never_served_stale(client, make_product, db):
+    # The write bypasses this process's cache invalidation, as one made by another worker would
+    product = make_product(name="Old name")
+    stale_etag = client.get(f"/products/{product['id']}").headers["ETag"]
+    db.execute(
+        update(Product)
+        .where(Product.id == product["id"])
+        .values(name="New name", updated_at=datetime.utcnow() + timedelta(seconds=1))
+    )
+    db.commit()
+
+    response = client.get(f"/products/{product['id']}", headers={"If-None-Match": stale_etag})
+    assert response.status_code == 200
+    assert response.json()["name"] == "New name"
+
+    fresh_etag = response.headers["ETag"]
+    assert fresh_etag != stale_etag
+    assert client.get(f"/products/{product['id']}").json()["name"] == "New name"
+    revalidated = client.get(f"/products/{product['id']}", headers={"If-None-Match": fresh_etag})
+    assert revalidated.status_code == 304
+
+def test_category_write_from_another_session_is_never_served_stale(client, make_product, db):
+    category_id = make_product()["category_id"]
+    client.get(f"/categories/{category_id}")
+    db.execute(
+        update(Category)
+        .where(Category.id == category_id)
+        .values(image_link="https://img.example.com/new.jpg", updated_at=datetime.utcnow() + timedelta(seconds=1))
+    )
+    db.commit()
+
+    assert client.get(f"/categories/{category_id}").json()["image_link"] == "https://img.example.com/new.jpg"
+    assert client.get("/categories/").json()[0]["image_link"] == "https://img.example.com/new.jpg"
+
+def test_unknown_product_is_404_without_validators(client):
+    response = client.get("/products/12345")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.database import run_db, run_db_offloaded, to_async_url
+from app.product_export import aiter_products, iter_products
+
+@pytest.mark.parametrize("url,expected", [
+    ("postgres://u:p@db/shop", "postgresql+asyncpg://u:p@db/shop"),
+    ("postgresql://u:p@db/shop", "postgresql+asyncpg://u:p@db/shop"),
+    ("postgresql+psycopg2://u:p@db/shop", "postgresql+asyncpg://u:p@db/shop"),
+    ("sqlite:////tmp/shop.db", "sqlite+aiosqlite:////tmp/shop.db"),
+    ("postgresql+asyncpg://u:p@db/shop", "postgresql+asyncpg://u:p@db/shop"),
+])
+def test_async_url(url, expected):
+    assert to_async_url(url) == expected
+
+@pytest.fixture
+def async_session(engine):
+    if engine.dialect.name != "sqlite":
+        pytest.skip("async path is exercised against the SQLite test database")
+    async_engine = create_async_engine(to_async_url(str(engine.url)))
+
+    async def run(body):
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                return await body(session)
+        finally:
+            await async_engine.dispose()
+
+    return lambda body: asyncio.run(run(body))
+
+def where(session):
+    return threading.get_ident(), session.execute(text("SELECT 1")).scalar()
+
+def test_query_work_stays_on_the_loop_and_cpu_work_is_offloaded(async_session):
+    async def body(session):
+        loop_thread = threading.get_ident()
+        on_loop, _ = await run_db(session, where)
+        offloaded, answer = await run_db_offloaded(session, where)
+        return loop_thread, on_loop, offloaded, answer
+
+    loop_thread, on_loop, offloaded, answer = async_session(body)
+    assert on_loop == loop_thread
+    assert offloaded != loop_thread
+    assert answer == 1
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_async_export_matches_sync_export(async_session, db, make_product, fmt):
+    for i in range(5):
+        make_product(name=f"Item {i}", colors=["red", "blue"])
+
+    async def body(session):
+        return [chunk async for chunk in aiter_products(session, fmt=fmt)]
+
+    assert "".join(async_session(body)) == "".join(iter_products(db, fmt=fmt))
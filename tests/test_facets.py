@@ -0,0 +1,53 @@
+from app import facets
+from app.cache import invalidate
+
+def counts(client, **filters):
+    body = client.get("/products/facets", params=filters).json()
+    return {name: {item["value"]: item["count"] for item in body[name]} for name in ("colors", "price", "rating", "in_stock")}, body["total"]
+
+def test_counts_follow_creates_and_updates(client, make_product, insert_path):
+    pen = make_product(name="Pen", price=3, color="red", colors=["red", "blue"], rating=4.5)
+    make_product(name="Folder", price=12, colors=["blue"], rating=3.2, in_stock=False)
+    make_product(name="Glue", price=40, category="Art")
+
+    facet, total = counts(client)
+    assert total == 3
+    assert facet["colors"] == {"blue": 2, "red": 1}
+    assert facet["price"] == {0: 1, 2: 1, 3: 1}
+    assert facet["rating"] == {None: 1, 3: 1, 4: 1}
+    assert facet["in_stock"] == {False: 1, True: 2}
+
+    client.put(f"/products/{pen['id']}", json={"price": 60, "colors": ["green"], "color": None})
+    facet, total = counts(client)
+    assert total == 3
+    assert facet["colors"] == {"blue": 1, "green": 1}
+    assert facet["price"] == {2: 1, 3: 1, 4: 1}
+
+def test_each_facet_ignores_its_own_filter(client, make_product, insert_path):
+    make_product(name="Pen", price=3, colors=["red"])
+    make_product(name="Marker", price=4, colors=["blue"])
+    make_product(name="Folder", price=12, colors=["blue"], in_stock=False)
+
+    facet, total = counts(client, color="blue", in_stock=True)
+    assert total == 1
+    # Other colors of in-stock products stay visible, as do out-of-stock blue ones
+    assert facet["colors"] == {"blue": 1, "red": 1}
+    assert facet["in_stock"] == {False: 1, True: 1}
+    assert facet["price"] == {0: 1}
+
+def test_counts_match_a_full_recount(client, make_product, db, insert_path):
+    for i in range(6):
+        make_product(name=f"Item {i}", price=i * 7, colors=["red"] if i % 2 else None, rating=i)
+    before = client.get("/products/facets").json()
+    facets.recount_facets(db)
+    db.commit()
+    invalidate("facets")
+    assert client.get("/products/facets").json() == before
+
+def test_only_price_buckets_carry_bounds(client, make_product):
+    make_product(name="Pen", price=3, colors=["red"], rating=4)
+    make_product(name="Easel", price=300, category="Art")
+    body = client.get("/products/facets").json()
+    assert body["price"] == [{"value": 0, "count": 1, "min": 0.0, "max": 5.0}, {"value": 6, "count": 1, "min": 250.0, "max": None}]
+    for name in ("categories", "colors", "rating", "in_stock"):
+        assert all(set(item) == {"value", "count"} for item in body[name])
@@ -0,0 +1,73 @@
+import asyncio
+import io
+import pytest
+from app import uploader
+from app.image import _cleanup_uploads, make_thumbnail
+from app.models.image_model import Image
+from app.uploader import LocalUploader, Uploader
+
+# Pillow is optional for the app but needed to make test images
+PILImage = pytest.importorskip("PIL.Image")
+
+def png(color="red", size=(640, 480)) -> bytes:
+    out = io.BytesIO()
+    PILImage.new("RGB", size, color).save(out, format="PNG")
+    return out.getvalue()
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    store = LocalUploader(str(tmp_path), "https://img.test")
+    monkeypatch.setattr(uploader, "uploader", store)
+    return tmp_path
+
+def stored(storage):
+    return sorted(str(path.relative_to(storage)) for path in storage.rglob("*") if path.is_file())
+
+def upload(client, product_id, *contents):
+    files = [("files", (f"{i}.png", content, "image/png")) for i, content in enumerate(contents)]
+    return client.post(f"/upload-image/multiple/?product_id={product_id}", files=files)
+
+def test_uploader_interface_is_abstract():
+    with pytest.raises(TypeError):
+        Uploader()
+
+def test_thumbnail_is_made_from_the_file_without_moving_it():
+    file = io.BytesIO(png(size=(1200, 800)))
+    thumbnail = make_thumbnail(file, size=320)
+    assert file.tell() == 0
+    assert PILImage.open(io.BytesIO(thumbnail)).size == (320, 213)
+
+def test_upload_stores_original_and_thumbnail_once(client, make_product, storage):
+    product = make_product()
+    response = upload(client, product["id"], png("red"), png("red"), png("blue"))
+    assert response.status_code == 200, response.text
+    images = response.json()
+    assert images[0] == images[1]
+    assert images[0]["thumbnail_url"].endswith("_thumb")
+    assert len(stored(storage)) == 4
+
+def test_failed_upload_removes_only_what_it_created(client, make_product, storage, monkeypatch):
+    product = make_product()
+    assert upload(client, product["id"], png("red")).status_code == 200
+    before = stored(storage)
+
+    real_upload = uploader.uploader.upload
+    def flaky_upload(file, public_id):
+        if public_id.endswith("_thumb"):
+            raise RuntimeError("store unavailable")
+        return real_upload(file, public_id)
+    monkeypatch.setattr(uploader.uploader, "upload", flaky_upload)
+
+    assert upload(client, product["id"], png("green"), png("red")).status_code == 500
+    assert stored(storage) == before
+
+def test_cleanup_keeps_objects_another_row_references(db, make_product, storage):
+    product = make_product()
+    for public_id in ("products/1/shared", "products/1/shared_thumb", "products/1/orphan"):
+        uploader.uploader.upload(io.BytesIO(b"data"), public_id)
+    # Another request saved a row for the same content-addressed object meanwhile
+    db.add(Image(image_url="https://img.test/products/1/shared", public_id="products/1/shared", product_id=product["id"]))
+    db.commit()
+
+    asyncio.run(_cleanup_uploads(["products/1/shared", "products/1/shared_thumb", "products/1/orphan"], db))
+    assert stored(storage) == ["products/1/shared", "products/1/shared_thumb"]
@@ -0,0 +1,54 @@
+from app import product_import
+
+CSV = (
+    "name,price,category,colors,specifications\n"
+    "Pencil,1.5,Stationery,red|blue,\n"
+    "Broken price,abc,Stationery,,\n"
+    "Eraser,0.5,Stationery,,\"[{\"\"name\"\": \"\"size\"\", \"\"value\"\": \"\"small\"\"}]\"\n"
+    "Bad spec,2,Stationery,,{not json\n"
+    "Ruler,3,Math,,\n"
+)
+
+def upload(client, content, filename, **params):
+    return client.post("/products/import", params=params, files={"file": (filename, content.encode())})
+
+def test_csv_import_reports_bad_rows_by_line_and_keeps_the_rest(client):
+    response = upload(client, CSV, "products.csv", batch_size=2)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["imported"] == 3
+    assert report["failed"] == 2
+    assert [error["row"] for error in report["errors"]] == [3, 5]
+    assert "price" in report["errors"][0]["error"]
+    assert report["errors"][1]["error"].startswith("Unparsable row")
+
+    products = client.get("/products/").json()
+    assert [product["name"] for product in products] == ["Pencil", "Eraser", "Ruler"]
+    assert products[0]["colors"] == ["red", "blue"]
+    counts = {category["category_name"]: category["product_count"] for category in client.get("/categories/").json()}
+    assert counts == {"Stationery": 2, "Math": 1}
+
+def test_ndjson_import_skips_blank_lines_and_reports_bad_json(client):
+    lines = '{"name": "Glue", "price": 2, "category": "Art"}\n\n{"name": \n{"price": 1}\n'
+    report = upload(client, lines, "products.ndjson").json()
+    assert report["imported"] == 1
+    assert [error["row"] for error in report["errors"]] == [3, 4]
+    assert "name" in report["errors"][1]["error"]
+
+def test_batch_with_a_bad_row_is_retried_row_by_row(client, make_product, monkeypatch):
+    taken = make_product(name="Existing")["id"]
+    product_row = product_import.product_row
+
+    def clashing_row(product):
+        # Passes validation but fails in the database: the id is already taken
+        values = product_row(product)
+        return dict(values, id=taken) if product.name == "Clash" else values
+
+    monkeypatch.setattr(product_import, "product_row", clashing_row)
+    lines = "".join(f'{{"name": "{name}", "price": 1, "category": "Art"}}\n' for name in ("Brush", "Clash", "Easel"))
+    report = upload(client, lines, "products.ndjson", batch_size=10).json()
+    assert report["imported"] == 2
+    assert [error["row"] for error in report["errors"]] == [2]
+    assert sorted(product["name"] for product in client.get("/products/").json()) == ["Brush", "Easel", "Existing"]
+    counts = {category["category_name"]: category["product_count"] for category in client.get("/categories/").json()}
+    assert counts["Art"] == 2
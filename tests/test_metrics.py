@@ -0,0 +1,42 @@
+import pytest
+from app import metrics
+from app.metrics import Metric
+
+def scrape(client) -> str:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    return response.text
+
+def sample(text: str, series: str) -> float:
+    [line] = [line for line in text.splitlines() if line.startswith(series + " ")]
+    return float(line.rsplit(" ", 1)[1])
+
+def test_metric_interface_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("abstract", "Not a metric")
+
+def test_request_latency_and_queries_are_labelled_by_route(client, make_product):
+    product = make_product()
+    client.get(f"/products/{product['id']}")
+    text = scrape(client)
+    assert sample(text, 'http_request_duration_seconds_count{method="GET",route="/products/{id}",status="200"}') >= 1
+    assert 'http_request_db_queries_bucket{method="GET",route="/products/{id}",le="+Inf"}' in text
+    assert f"/products/{product['id']}\"" not in text
+
+def test_cache_counters_are_totals(client, make_product):
+    product = make_product()
+    before = sample(scrape(client), "cache_hits_total")
+    client.get(f"/products/{product['id']}")
+    client.get(f"/products/{product['id']}")
+    text = scrape(client)
+    assert "# TYPE cache_hits_total counter" in text
+    assert "# TYPE cache_evictions_total counter" in text
+    assert sample(text, "cache_hits_total") > before
+
+def test_pools_are_one_metric_labelled_by_engine(client):
+    text = scrape(client)
+    assert text.count("# TYPE db_pool_size gauge") == 1
+    if metrics._POOLS:
+        assert 'db_pool_size{pool="db"}' in text
+    assert "replica0_pool" not in text
@@ -0,0 +1,50 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect, select
+from app import main
+from app.migrate import add_column, migrate
+
+@pytest.fixture
+def scratch(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/scratch.db")
+    old = Table("widgets", MetaData(), Column("id", Integer, primary_key=True))
+    with engine.begin() as conn:
+        old.create(conn)
+        conn.execute(old.insert(), [{"id": 1}, {"id": 2}])
+    return engine
+
+def test_not_null_column_is_added_to_a_populated_table(scratch):
+    new = Table(
+        "widgets", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("active", Boolean, nullable=False, default=True),
+        Column("seen_at", DateTime, nullable=False, default=datetime.utcnow),
+        Column("label", String, nullable=False, server_default="none"),
+    )
+    with scratch.begin() as conn:
+        for name in ("active", "seen_at", "label"):
+            add_column(conn, new, new.c[name])
+        rows = conn.execute(select(new)).all()
+    assert [(row.active, row.label) for row in rows] == [(True, "none"), (True, "none")]
+    assert all(isinstance(row.seen_at, datetime) for row in rows)
+
+def test_not_null_column_without_any_default_is_refused(scratch):
+    new = Table("widgets", MetaData(), Column("id", Integer, primary_key=True), Column("code", String, nullable=False))
+    with scratch.begin() as conn, pytest.raises(RuntimeError, match="BACKFILLS"):
+        add_column(conn, new, new.c.code)
+    assert "code" not in {column["name"] for column in inspect(scratch).get_columns("widgets")}
+
+def test_migrate_is_idempotent(engine):
+    migrate(engine)
+    migrate(engine)
+
+def test_readiness_reports_database_failures(client, monkeypatch):
+    assert client.get("/health/ready").json() == {"status": "ok"}
+
+    def unavailable(db):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(main, "check_ready", unavailable)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert client.get("/health/live").status_code == 200
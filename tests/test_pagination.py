@@ -0,0 +1,85 @@
+import pytest
+
+RATINGS = [4.0, None, 2.5, 4.0, None, 5.0, 1.0, None, 2.5]
+
+@pytest.fixture
+def products(make_product):
+    return [make_product(name=f"Item {i}", price=10 - i, rating=rating) for i, rating in enumerate(RATINGS)]
+
+def expected(products, field, descending=False):
+    rated = sorted((p for p in products if p[field] is not None), key=lambda p: (p[field], p["id"]), reverse=descending)
+    unrated = sorted((p for p in products if p[field] is None), key=lambda p: p["id"], reverse=descending)
+    return [p["id"] for p in rated + unrated]
+
+def walk(client, url, limit):
+    ids, cursor = [], None
+    while True:
+        response = client.get(url, params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        ids += [item["id"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+@pytest.mark.parametrize("sort,field,descending", [
+    ("id", "id", False), ("price", "price", False), ("-price", "price", True),
+    ("rating", "rating", False), ("-rating", "rating", True),
+])
+@pytest.mark.parametrize("limit", [1, 2, 4, 20])
+def test_cursor_pages_cover_every_product_once_with_nulls_last(client, products, sort, field, descending, limit):
+    assert walk(client, f"/products/?sort={sort}", limit) == expected(products, field, descending)
+
+@pytest.mark.parametrize("sort", ["rating", "-rating"])
+def test_offset_pages_follow_the_cursor_order(client, products, sort):
+    ids = [p["id"] for skip in range(0, 9, 2) for p in client.get(f"/products/?sort={sort}&skip={skip}&limit=2").json()]
+    assert ids == walk(client, f"/products/?sort={sort}", 3)
+
+def test_fields_listing_pages_through_nulls(client, products):
+    assert walk(client, "/products/?sort=-rating&fields=summary", 2) == expected(products, "rating", True)
+
+def test_categories_by_name(client, make_product):
+    for name in ["Paper", "Art", "Books", "Math"]:
+        make_product(category=name)
+    response = walk(client, "/categories/?sort=name", 3)
+    assert [client.get(f"/categories/{i}").json()["category_name"] for i in response] == ["Art", "Books", "Math", "Paper"]
+
+def test_bad_cursors_are_rejected(client, products):
+    cursor = client.get("/products/?sort=price&limit=2").headers["X-Next-Cursor"]
+    assert client.get(f"/products/?sort=rating&cursor={cursor}").status_code == 400
+    assert client.get("/products/?cursor=not-a-cursor").status_code == 400
+    assert client.get("/products/?sort=colour").status_code == 400
+
+def cursor_at_first_null(client):
+    # Eight rated products fill the first page, so the next cursor is inside the NULL segment
+    return client.get("/products/?sort=rating&limit=7").headers["X-Next-Cursor"]
+
+@pytest.mark.parametrize("sort,index", [
+    ("rating", "ix_products_rating_id"), ("-rating", "ix_products_rating_id"),
+    ("price", "ix_products_price_id"), ("-created_at", "ix_products_created_at_id"),
+])
+def test_pages_are_index_range_scans(client, products, explain, sort, index):
+    cursor = client.get(f"/products/?sort={sort}&limit=2").headers["X-Next-Cursor"]
+    plan = explain(f"/products/?sort={sort}&limit=20&cursor={cursor}")
+    assert index in plan
+    assert "TEMP B-TREE" not in plan and "Sort" not in plan
+
+def test_null_segment_is_an_index_range_scan(client, products, explain):
+    plan = explain(f"/products/?sort=rating&limit=2&cursor={cursor_at_first_null(client)}")
+    assert "ix_products_rating_id" in plan
+    assert "TEMP B-TREE" not in plan and "Sort" not in plan
+
+def test_category_name_sort_uses_name_index(client, make_product, explain):
+    make_product(category="Art")
+    make_product(category="Books")
+    cursor = client.get("/categories/?sort=name&limit=1").headers["X-Next-Cursor"]
+    plan = explain(f"/categories/?sort=name&cursor={cursor}", table="categories")
+    assert "sqlite_autoindex_categories_1" in plan or "categories_category_name_key" in plan
+    assert "TEMP B-TREE" not in plan and "Sort" not in plan
+
+@pytest.mark.parametrize("url", ["/products/", "/categories/"])
+def test_skip_is_ignored_with_a_cursor(client, make_product, url):
+    for i in range(6):
+        make_product(name=f"Item {i}", category=f"Category {i}")
+    cursor = client.get(url, params={"limit": 2}).headers["X-Next-Cursor"]
+    with_skip = client.get(url, params={"limit": 2, "cursor": cursor, "skip": 2}).json()
+    assert with_skip == client.get(url, params={"limit": 2, "cursor": cursor}).json()
@@ -0,0 +1,55 @@
+import logging
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app import profiling
+from app.main import get_db
+from app.models.categories_model import Product
+from app.profiling import capture_queries, statement_shape
+
+@pytest.fixture
+def n_plus_one_client(engine):
+    # A listing that touches product.category row by row: one lazy load per category
+    app = FastAPI()
+    app.add_middleware(profiling.ProfileMiddleware)
+
+    @app.get("/product-categories")
+    def product_categories(db=Depends(get_db)):
+        products = db.execute(select(Product).order_by(Product.id)).scalars().all()
+        return [product.category.category_name for product in products]
+
+    with TestClient(app) as client:
+        yield client
+
+def test_n_plus_one_is_flagged(n_plus_one_client, make_product, caplog):
+    for i in range(6):
+        make_product(category=f"Category {i}")
+
+    with caplog.at_level(logging.WARNING, logger="app.profiling"), capture_queries() as profile:
+        response = n_plus_one_client.get("/product-categories")
+    assert response.status_code == 200
+    assert profile.count == 7
+    assert "db;dur=" in response.headers["Server-Timing"]
+
+    [(shape, count)] = profile.repeated().items()
+    assert count == 6
+    assert shape.startswith("SELECT categories.")
+    assert "WHERE categories.id = " in shape
+    [record] = [record for record in caplog.records if "Probable N+1" in record.getMessage()]
+    assert "/product-categories" in record.getMessage()
+
+def test_batched_image_loading_is_not_flagged(client, make_product):
+    for i in range(6):
+        make_product(name=f"Pen {i}")
+
+    with capture_queries() as profile:
+        response = client.get("/products/?include=images")
+    assert len(response.json()) == 6
+    assert profile.repeated() == {}
+    assert profile.count <= 4
+
+def test_statement_shape_collapses_parameter_lists():
+    assert statement_shape("SELECT *\n FROM images WHERE product_id IN (?, ?,  ?)") == \
+        "SELECT * FROM images WHERE product_id IN (?)"
+    assert statement_shape("SELECT * FROM t WHERE id IN (%(id_1)s, %(id_2)s)") == "SELECT * FROM t WHERE id IN (?)"
@@ -0,0 +1,88 @@
+import sqlite3
+import pytest
+from fastapi.testclient import TestClient
+from app import cache, replicas
+from app.main import app
+from app.replicas import STICKY_COOKIE, ReplicaSet, TrackWritesMiddleware
+
+@pytest.fixture
+def client(engine):
+    # The app only installs the middleware when DATABASE_REPLICA_URLS is set at startup
+    with TestClient(TrackWritesMiddleware(app)) as client:
+        yield client
+
+@pytest.fixture
+def replica(engine, tmp_path, monkeypatch):
+    """A replica that only sees the primary's data as of the last snapshot() call."""
+    if engine.dialect.name != "sqlite":
+        pytest.skip("replicas are simulated with SQLite file snapshots")
+    path = tmp_path / "replica.db"
+
+    def snapshot():
+        source, target = sqlite3.connect(engine.url.database), sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        target.close()
+
+    snapshot()
+    replica_set = ReplicaSet([f"sqlite:///{path}"])
+    monkeypatch.setattr(replicas, "replicas", replica_set)
+    monkeypatch.setattr(replicas, "_recent_writers", cache.MemoryCache())
+    replica_set.snapshot = snapshot
+    return replica_set
+
+def cached_products():
+    return [key for key in cache.cache._data if key.startswith("product:")]
+
+def test_reads_go_to_the_replica(client, make_product, replica):
+    product = make_product(name="Old name")
+    replica.snapshot()
+    client.put(f"/products/{product['id']}", json={"name": "New name"})
+    client.cookies.clear()
+
+    assert client.get(f"/products/{product['id']}").json()["name"] == "Old name"
+
+def test_replica_reads_do_not_fill_the_cache(client, make_product, replica):
+    product = make_product()
+    replica.snapshot()
+    client.cookies.clear()
+
+    assert client.get(f"/products/{product['id']}").status_code == 200
+    assert cached_products() == []
+
+def test_writer_reads_its_own_writes_after_a_replica_read(client, make_product, replica):
+    product = make_product(name="Old name")
+    replica.snapshot()
+    client.cookies.clear()
+    # Another client reads the lagging replica in between
+    assert client.get(f"/products/{product['id']}").json()["name"] == "Old name"
+
+    response = client.put(f"/products/{product['id']}", json={"name": "New name"})
+    assert STICKY_COOKIE in response.cookies
+    assert client.get(f"/products/{product['id']}").json()["name"] == "New name"
+    assert len(cached_products()) == 1
+
+def test_sticky_routing_by_token_not_address(client, make_product, replica):
+    product = make_product(name="Old name")
+    replica.snapshot()
+    client.put(f"/products/{product['id']}", json={"name": "New name"}, headers={"Authorization": "Bearer writer"})
+    make_product(name="Anonymous write")
+    client.cookies.clear()
+
+    url = f"/products/{product['id']}"
+    assert client.get(url, headers={"Authorization": "Bearer writer"}).json()["name"] == "New name"
+    # Same address, different client: no stickiness
+    assert client.get(url, headers={"Authorization": "Bearer reader"}).json()["name"] == "Old name"
+    assert client.get(url).json()["name"] == "Old name"
+
+def test_unavailable_replica_falls_back_to_primary(client, make_product, tmp_path, monkeypatch):
+    product = make_product()
+    broken = ReplicaSet([f"sqlite:///{tmp_path}/missing/replica.db"])
+    monkeypatch.setattr(replicas, "replicas", broken)
+    client.cookies.clear()
+
+    response = client.get(f"/products/{product['id']}")
+    assert response.status_code == 200
+    assert response.json()["name"] == product["name"]
+    assert not broken.replicas[0].healthy
+    assert broken.choose() is None
@@ -0,0 +1,67 @@
+import pytest
+
+@pytest.fixture
+def catalog(make_product):
+    return [
+        make_product(name="Red pen", price=1.0, color="red", colors=["red"], tags="school,office", rating=4.5),
+        make_product(name="Blue pen", price=2.0, colors=["blue", "red"], tags="school", rating=3.0, in_stock=False),
+        make_product(name="Green folder", price=8.0, category="Folders", colors=["green"], tags="office", rating=4.8),
+        make_product(name="Plain ruler", price=3.5, category="Folders", tags="school,math"),
+    ]
+
+def names(response):
+    assert response.status_code == 200, response.text
+    return [product["name"] for product in response.json()]
+
+def test_color_matches_color_column_or_colors_array(client, catalog):
+    assert names(client.get("/products/search?color=red")) == ["Red pen", "Blue pen"]
+    assert names(client.get("/products/search?color=green")) == ["Green folder"]
+    assert names(client.get("/products/search?color=purple")) == []
+
+def test_colors_requires_every_color(client, catalog):
+    assert names(client.get("/products/search?colors=red")) == ["Red pen", "Blue pen"]
+    assert names(client.get("/products/search?colors=red&colors=blue")) == ["Blue pen"]
+
+def test_filters_combine(client, catalog):
+    folders = catalog[2]["category_id"]
+    assert names(client.get(f"/products/search?category_id={folders}")) == ["Green folder", "Plain ruler"]
+    assert names(client.get("/products/search?min_price=1.5&max_price=4")) == ["Blue pen", "Plain ruler"]
+    assert names(client.get("/products/search?in_stock=true&tags=school")) == ["Red pen", "Plain ruler"]
+    assert names(client.get("/products/search?min_rating=4&sort=-price")) == ["Green folder", "Red pen"]
+
+def test_tags_are_matched_literally(client, catalog):
+    assert names(client.get("/products/search?tags=%25")) == []
+    assert names(client.get("/products/search?tags=MATH")) == ["Plain ruler"]
+
+def test_min_price_above_max_price_is_rejected(client):
+    assert client.get("/products/search?min_price=5&max_price=1").status_code == 400
+
+def test_category_filter_uses_category_index(catalog, explain):
+    plan = explain(f"/products/search?category_id={catalog[0]['category_id']}")
+    assert "ix_products_category_id_id" in plan
+
+def test_price_range_uses_price_index(catalog, explain):
+    plan = explain("/products/search?min_price=1&max_price=3&sort=price")
+    assert "ix_products_price_id" in plan
+
+def test_in_stock_price_range_uses_partial_index(catalog, explain, engine):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("partial index is Postgres-only")
+    plan = explain("/products/search?in_stock=true&min_price=1&sort=price")
+    assert "ix_products_in_stock_price" in plan
+
+def test_colors_filter_uses_gin_index(catalog, explain, engine):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("GIN index is Postgres-only")
+    assert "ix_products_colors" in explain("/products/search?colors=red")
+
+def test_tags_filter_uses_trigram_index(catalog, explain, engine):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("pg_trgm index is Postgres-only")
+    assert "ix_products_tags_trgm" in explain("/products/search?tags=school")
+
+@pytest.mark.parametrize("name", ["ix_products_in_stock_price", "ix_products_colors", "ix_products_tags_trgm"])
+def test_postgres_only_indexes_are_not_created_elsewhere(engine, name):
+    from sqlalchemy import inspect
+    indexes = {index["name"] for index in inspect(engine).get_indexes("products")}
+    assert (name in indexes) == (engine.dialect.name == "postgresql")
@@ -0,0 +1,97 @@
+import threading
+from app import suggest
+from app.suggest import SuggestIndex, maintain
+
+def make_index(names, **kwargs):
+    index = SuggestIndex(**kwargs)
+    for product_id, name in enumerate(names, start=1):
+        index.add(product_id, name, "school", 2.0, 5 - product_id / 100, True)
+    index.ready = True
+    return index
+
+def names(results):
+    return [result["name"] for result in results]
+
+def test_name_prefix_ranks_first_and_typos_are_corrected():
+    index = make_index(["Blue notebook", "Notebook cover", "Pencil case"])
+    assert names(index.suggest("note")) == ["Notebook cover", "Blue notebook"]
+    assert names(index.suggest("notbook")) == ["Notebook cover", "Blue notebook"]
+    assert names(index.suggest("zzzz")) == []
+
+def test_index_stops_growing_at_max_products():
+    index = make_index(["Pen one", "Pen two", "Pen three"], max_products=2)
+    assert index.stats()["products"] == 2
+    assert index.stats()["skipped"] == 1
+    # Products already indexed still take updates
+    index.add(1, "Marker one", None, 1.0, 4.0, True)
+    assert names(index.suggest("mark")) == ["Marker one"]
+
+def test_candidates_examined_per_query_are_capped(monkeypatch):
+    monkeypatch.setattr(suggest, "SUGGEST_CANDIDATE_LIMIT", 100)
+    # Every name shares the query's grams but only the last one matches it
+    index = make_index([f"pen cast base {i}" for i in range(500)] + ["pen case"])
+    examined = []
+    candidates = index._candidates
+
+    def counting(words):
+        for product_id in candidates(words):
+            examined.append(product_id)
+            yield product_id
+
+    monkeypatch.setattr(index, "_candidates", counting)
+    assert index.suggest("pen case") == []
+    assert len(examined) == 100
+
+class FlakyEngine:
+    def __init__(self, engine, failures):
+        self.engine = engine
+        self.failures = failures
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("database is starting up")
+        return self.engine.connect()
+
+def test_failed_build_is_retried_with_backoff(engine, make_product, monkeypatch):
+    make_product(name="Glitter pen")
+    monkeypatch.setattr(suggest, "SUGGEST_REFRESH_SECONDS", 0.01)
+    monkeypatch.setattr(suggest, "SUGGEST_RETRY_MAX_SECONDS", 0.02)
+    waits = []
+    stop = threading.Event()
+    index = SuggestIndex()
+    flaky = FlakyEngine(engine, failures=3)
+
+    class RecordingStop:
+        def wait(self, delay):
+            waits.append(delay)
+            if index.ready:
+                stop.set()
+            return stop.wait(delay)
+
+    maintain(index, flaky, RecordingStop())
+    assert index.ready
+    assert names(index.suggest("glit")) == ["Glitter pen"]
+    assert waits[:5] == [0.0, 0.01, 0.02, 0.02, 0.01]
+
+def test_tag_prefix_is_found_among_many_distinct_tags():
+    index = SuggestIndex()
+    for product_id in range(1, 2001):
+        index.add(product_id, f"Pen {product_id}", f"school,sku-{product_id:05d}", 1.0, 4.0, True)
+    index.ready = True
+    assert names(index.suggest("sku-00042")) == ["Pen 42"]
+    assert len(index.suggest("sku-0004", limit=50)) == 10
+    assert index.suggest("zzzz") == []
+    # Tags added later are merged into the sorted list
+    index.add(3000, "Ruler", "sku-99999", 1.0, 4.0, True)
+    assert names(index.suggest("sku-999")) == ["Ruler"]
+
+def test_suggest_endpoint_is_404_when_the_index_is_disabled(client, monkeypatch):
+    monkeypatch.setattr(suggest, "SUGGEST_INDEX", False)
+    assert client.get("/products/suggest?q=pen").status_code == 404
+    monkeypatch.setattr(suggest, "SUGGEST_INDEX", True)
+    monkeypatch.setattr(suggest.suggest_index, "ready", False)
+    response = client.get("/products/suggest?q=pen")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,73 @@
+import asyncio
+import io
+import pytest
+from starlette.datastructures import UploadFile
+from app import upload_limits
+from app.image import sniff_image_type
+from app.upload_limits import PartLimiter, UploadTooLarge
+
+BOUNDARY = b"xYzZy"
+
+def body(*parts) -> bytes:
+    out = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        out += b"--" + BOUNDARY + b"\r\nContent-Disposition: " + disposition.encode() + b"\r\n\r\n" + content + b"\r\n"
+    return out + b"--" + BOUNDARY + b"--\r\n"
+
+def feed(limiter, data: bytes, chunk_size: int) -> None:
+    for i in range(0, len(data), chunk_size):
+        limiter.feed(data[i:i + chunk_size])
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_parts_under_the_limit_pass_whatever_the_chunking(chunk_size):
+    # Contents full of near-boundaries must not be mistaken for the end of a part
+    content = (b"\r\n--xYzZ" + b"a" * 20) * 3
+    feed(PartLimiter(BOUNDARY, len(content)), body(("files", "a.png", content), ("files", "b.png", content)), chunk_size)
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_oversized_file_is_named(chunk_size):
+    data = body(("files", "small.png", b"a" * 10), ("files", "big.png", b"b" * 101))
+    with pytest.raises(UploadTooLarge, match="File big.png exceeds 100 bytes"):
+        feed(PartLimiter(BOUNDARY, 100), data, chunk_size)
+
+def test_plain_fields_are_not_file_limited():
+    feed(PartLimiter(BOUNDARY, 10), body(("note", None, b"x" * 100)), 4096)
+
+def upload(client, *contents):
+    files = [("files", (f"{i}.png", content, "image/png")) for i, content in enumerate(contents)]
+    return client.post("/upload-image/multiple/?product_id=1", files=files)
+
+def test_oversized_file_is_rejected_with_413(client, monkeypatch):
+    monkeypatch.setattr(upload_limits, "UPLOAD_MAX_FILE_BYTES", 1000)
+    response = upload(client, b"a" * 500, b"b" * 2000)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "File 1.png exceeds 1000 bytes"
+
+def test_oversized_request_is_rejected_with_413(client, monkeypatch):
+    monkeypatch.setattr(upload_limits, "UPLOAD_MAX_REQUEST_BYTES", 3000)
+    response = upload(client, b"a" * 2000, b"b" * 2000)
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Request body exceeds 3000 bytes"
+
+def ftyp(major: bytes, *compatible: bytes) -> bytes:
+    box = b"ftyp" + major + b"\0\0\0\0" + b"".join(compatible)
+    return (len(box) + 4).to_bytes(4, "big") + box + b"\0" * 32
+
+def sniff(header: bytes):
+    return asyncio.run(sniff_image_type(UploadFile(io.BytesIO(header))))
+
+@pytest.mark.parametrize("header, kind", [
+    (b"\xff\xd8\xff\xe0" + b"\0" * 20, "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n" + b"\0" * 20, "image/png"),
+    (ftyp(b"avif", b"mif1", b"miaf"), "image/avif"),
+    (ftyp(b"avis", b"msf1"), "image/avif"),
+    (ftyp(b"mif1", b"miaf", b"MiHB", b"heic"), "image/heic"),
+    (ftyp(b"heix", b"mif1"), "image/heic"),
+    (ftyp(b"msf1", b"hevc"), "image/heic"),
+    (ftyp(b"mif1", b"miaf"), "image/heif"),
+    (ftyp(b"isom", b"iso2", b"mp41"), None),
+    (b"not an image at all", None),
+])
+def test_sniff_image_type(header, kind):
+    assert sniff(header) == kind